@@ -31,6 +31,12 @@ apptainer_image=""
 
 #__________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________
 
+## The number of shards to split the families into, to run VIA as a SLURM array job with one task per shard
+## (e.g. shards="8"), followed by a job merging the shards into the output file. Leave empty to run a single job
+shards=""
+
+#__________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________
+
 # Get the current timestamp:
 start_timestamp=$(date "+%Y-%m-%d %H:%M:%S")
 
@@ -68,18 +74,41 @@ echo -e "\n\n"
 
 #__________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________
 
-# Run apptainer with the dynamically created bind args
-apptainer exec \
-  --bind "$(dirname "$mendelian_step_output")" \
-  --bind "$(dirname "$phenotype_file")" \
-  --bind "$(dirname "$output_file")" \
-  --bind "$(dirname "$pedigree_file")" \
-  "$apptainer_image" /entrypoint.sh python /via/main.py \
-    --pedfile "$pedigree_file" \
-    --data "$mendelian_step_output" \
-    --output "$output_file" \
-    --phenfile "$phenotype_file" \
-    --mapfile "$hpo_mapping_file"
+# Run a python script of VIA (/via/<script>) in apptainer with the dynamically created bind args
+run_via() {
+  local script=$1
+  shift
+  apptainer exec \
+    --bind "$(dirname "$mendelian_step_output")" \
+    --bind "$(dirname "$phenotype_file")" \
+    --bind "$(dirname "$output_file")" \
+    --bind "$(dirname "$pedigree_file")" \
+    "$apptainer_image" /entrypoint.sh python "/via/$script" "$@"
+}
+
+via_args=(
+  --pedfile "$pedigree_file"
+  --data "$mendelian_step_output"
+  --output "$output_file"
+  --phenfile "$phenotype_file"
+  --mapfile "$hpo_mapping_file"
+)
+
+if [[ -z "$shards" ]]; then
+  # A single job over the whole cohort
+  run_via main.py "${via_args[@]}"
+elif [[ -n "$SLURM_ARRAY_TASK_ID" ]]; then
+  # A task of the array job: filter one shard of the families
+  run_via main.py "${via_args[@]}" --shard "$SLURM_ARRAY_TASK_ID/$shards"
+elif [[ "$VIA_MERGE" == "1" ]]; then
+  # The job after the array job: merge the shards into the output file
+  run_via merge.py --output "$output_file" --shards "$shards" --clean
+else
+  # Submit this script as an array job with one task per shard, and as a job merging the shards once every task succeeded
+  array_job=$(sbatch --parsable --array=1-"$shards" "$0") || exit 1
+  merge_job=$(sbatch --parsable --dependency=afterok:"$array_job" --export=ALL,VIA_MERGE=1 "$0") || exit 1
+  echo "Submitted array job $array_job with $shards shards, merged by job $merge_job"
+fi
 
 #__________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________________
 
@@ -0,0 +1,88 @@
+# Regression check and benchmark for cmpd_het_model in models.py.
+#
+# Generates an exome-scale variant data frame (by default 200,000 variants
+# over 18,000 genes) for a family with both parents, one with only a mother
+# and one without parents, and compares cmpd_het_model with the original
+# implementation, which filters the candidates once per gene and copies them
+# again for every gene it rejects (see compare in synthetic.py).
+#
+# Run from the repository's directory with:
+#   python benchmarks/cmpd_het.py
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from family import Family, Person
+from models import *
+from synthetic import compare, variants
+
+# the original implementation of cmpd_het_model
+def cmpd_het_loop(df, fam):
+    newdf = df.copy()
+    newdf = filter_zyg(newdf, fam.child.ID, "0/1")
+    newdf = newdf.dropna(subset=["Gene.refGene"])
+    newdf['Gene'] = newdf["Gene.refGene"].copy().str.partition(";")[0]
+
+    finaldf = newdf[newdf.duplicated(subset=['Gene'], keep=False)]
+    if(fam.hasFather or fam.hasMother):
+        genes = finaldf["Gene"].unique()
+        both_available = fam.hasFather and fam.hasMother
+        if not both_available:
+            available_ID = fam.father.ID if fam.hasFather else fam.mother.ID
+        for gene in genes:
+            genedf = finaldf[finaldf["Gene"]==gene]
+            if(both_available):
+                mom = sum(genedf[fam.mother.ID].str.contains("0/1") &
+                          genedf[fam.father.ID].str.contains("0/0"))
+                dad = sum(genedf[fam.mother.ID].str.contains("0/0") &
+                          genedf[fam.father.ID].str.contains("0/1"))
+                if(mom==0 or dad==0):
+                    finaldf = finaldf[finaldf["Gene"]!=gene]
+            else:
+                parentvariants = sum(genedf[available_ID].str.contains("0/1"))
+                parentnonvariants = sum(genedf[available_ID].str.contains("0/0"))
+                if(parentvariants == 0 or parentnonvariants == 0):
+                    finaldf = finaldf[finaldf["Gene"]!=gene]
+
+    del finaldf['Gene']
+    add_columns(finaldf, fam, "ch")
+    return finaldf
+
+# make a Family object (ID) with an affected child and the parents in
+# (parents), e.g. ["Father", "Mother"]
+def family(ID, parents):
+    fam = Family(ID)
+    fam.child = Person(ID + "-3", "Male", "Affected")
+    fam.people.append(fam.child)
+    if "Father" in parents:
+        fam.father = Person(ID + "-1", "Male", "Unaffected")
+        fam.hasFather = True
+        fam.people.append(fam.father)
+    if "Mother" in parents:
+        fam.mother = Person(ID + "-2", "Female", "Unaffected")
+        fam.hasMother = True
+        fam.people.append(fam.mother)
+    return fam
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--rows', default=200000, type=int)
+    argp.add_argument('--genes', default=18000, type=int)
+    argp.add_argument('--seed', default=0, type=int)
+    args = argp.parse_args()
+
+    families = [family("TRIO", ["Father", "Mother"]),
+                family("DUO", ["Mother"]),
+                family("SINGLE", [])]
+    samples = [person.ID for fam in families for person in fam.people]
+    df = variants(args.rows, args.genes, samples, seed = args.seed)
+
+    print("{:>8} {:>8} {:>10} {:>11} {:>8}".format(
+        "family", "rows", "loop (s)", "groupby (s)", "speedup"))
+    for fam in families:
+        result, loop_time, groupby_time = compare(cmpd_het_loop, cmpd_het_model, [df, fam])
+        print("{:>8} {:8d} {:10.3f} {:11.3f} {:7.1f}x".format(
+            fam.ID, len(result), loop_time, groupby_time, loop_time / groupby_time))
+    print("cmpd_het_model matches the original implementation.")
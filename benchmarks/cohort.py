@@ -0,0 +1,64 @@
+# Generates the input files of a synthetic cohort for VIA, at a given scale:
+# - variants.txt: an ANNOVAR-style variant data file
+# - pedigree.txt: the pedfile, with trios and, if --multiplex is given,
+#   families with several affected children
+# - phenotypes.txt: the phenfile, with one to three HPO numbers per family
+# - phenotype_to_genes.txt: the mapfile of HPO numbers to genes
+#
+# Run from the repository's directory with e.g.:
+#   python benchmarks/cohort.py --rows 100000 --families 20 --multiplex .5 -o cohort
+#   python main.py -p cohort/pedigree.txt -d cohort/variants.txt \
+#       -ph cohort/phenotypes.txt -m cohort/phenotype_to_genes.txt
+
+import argparse
+import os
+
+from synthetic import annovar_variants, hpo_map, pedigree, phenotypes
+
+# the names of the files of a cohort, in the order of write_cohort
+COHORT_FILES = ["pedigree.txt", "phenotypes.txt", "phenotype_to_genes.txt", "variants.txt"]
+
+# add the options that describe a cohort to the argument parser (argp)
+def add_cohort_arguments(argp):
+    argp.add_argument('--rows', default=100000, type=int)
+    argp.add_argument('--genes', default=18000, type=int)
+    argp.add_argument('--families', default=10, type=int)
+    argp.add_argument('--multiplex', default=0, type=float,
+                      help="the share of families with several affected children")
+    argp.add_argument('--affected', default=3, type=int,
+                      help="the number of affected children of multiplex families")
+    argp.add_argument('--chrx', default=.05, type=float,
+                      help="the share of variants on chrX")
+    argp.add_argument('--terms', default=500, type=int,
+                      help="the number of HPO numbers in the mapfile")
+    argp.add_argument('--seed', default=0, type=int)
+
+# write the files of a cohort described by the parsed arguments (args) into
+# the directory (directory).
+# returns a list of the paths of the files, in the order of COHORT_FILES
+def write_cohort(args, directory):
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, name) for name in COHORT_FILES]
+
+    ped = pedigree(args.families, args.multiplex, args.affected, seed = args.seed)
+    ped.to_csv(paths[0], sep='\t', index=False)
+    phenotypes(ped, args.terms, seed = args.seed).to_csv(paths[1], sep='\t', index=False)
+
+    # the header of the mapfile is a comment, as in the HPO release
+    mapping = hpo_map(args.terms, args.genes, seed = args.seed)
+    with open(paths[2], "w") as f:
+        f.write("#Format: " + "<tab>".join(mapping.columns) + "\n")
+        mapping.to_csv(f, sep='\t', index=False, header=False)
+
+    variants = annovar_variants(args.rows, args.genes, ped, args.chrx, seed = args.seed)
+    variants.to_csv(paths[3], sep='\t', index=False)
+    return paths
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    add_cohort_arguments(argp)
+    argp.add_argument('-o', '--output', default="cohort")
+    args = argp.parse_args()
+
+    for path in write_cohort(args, args.output):
+        print("Wrote", path)
@@ -0,0 +1,59 @@
+# Regression check and benchmark for combine_duplicates in utils.py.
+#
+# Generates candidate variant data frames like the ones filter_family builds
+# (the same variant found for several samples and inheritance models), and
+# compares combine_duplicates with the original row-by-row implementation
+# (see compare in synthetic.py).
+#
+# Run from the repository's directory with:
+#   python benchmarks/combine_duplicates.py
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import combine_duplicates
+from synthetic import candidates, compare
+
+# the original implementation of combine_duplicates, which filters the whole
+# data frame once per unique location and concatenates one row at a time
+def combine_duplicates_loop(df):
+    df["loc"] = [chrom + str(start) + str(end) for chrom, start, end in
+                        zip(df['Chr'], df['Start'], df["End"])]
+    uniquelocs = df["loc"].unique()
+    combined = pd.DataFrame()
+    for loc in uniquelocs:
+        rows = df[df["loc"] == loc]
+        output = rows.head(1).copy()
+        samplestring = ""
+        for sample in rows["sample"]:
+            samplestring += sample + ","
+        samplestring = samplestring[:-1]
+        modelstring = ""
+        for model in rows["inh model"]:
+            modelstring += model + ","
+        modelstring = modelstring[:-1]
+        output["sample"] = [samplestring]
+        output["inh model"] = [modelstring]
+        del (output["loc"])
+        combined = pd.concat([combined, output])
+    return combined
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--sizes', default="1000,5000,20000")
+    argp.add_argument('--dup', default=3, type=int)
+    argp.add_argument('--seed', default=0, type=int)
+    args = argp.parse_args()
+
+    print("{:>8} {:>10} {:>11} {:>8}".format("rows", "loop (s)", "groupby (s)", "speedup"))
+    for n in [int(size) for size in args.sizes.split(",")]:
+        df = candidates(n, args.dup, seed = args.seed)
+        result, loop_time, groupby_time = compare(combine_duplicates_loop, combine_duplicates,
+                                                  [df], copy = True)
+        print("{:8d} {:10.3f} {:11.3f} {:7.1f}x".format(n, loop_time, groupby_time,
+                                                        loop_time / groupby_time))
+    print("combine_duplicates matches the original implementation.")
@@ -0,0 +1,133 @@
+# Regression check and benchmark for writing the output file by streaming the
+# candidates of each family (--stream-output, see output.py) instead of
+# putting them together in memory.
+#
+# Generates the candidates of 100 to 1,000 families one family at a time,
+# and writes them to a CSV file both the way main.py does (gathering the
+# families in a list, concatenating, sorting and writing them) and with an
+# OutputStream, checks that the two files are the same, and compares the
+# time and the peak of the memory allocated while writing them. Then writes
+# the candidates of the fewest families to a file of every compressed format
+# (see output.py) both ways, and checks that each file decompresses, with the
+# compression modules themselves rather than pandas, to the same bytes as
+# the CSV file.
+#
+# Run from the repository's directory with:
+#   python benchmarks/output_writers.py
+
+import argparse
+import bz2
+import filecmp
+import gzip
+import lzma
+import os
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from output import *
+from synthetic import candidates, timed
+
+# generate the candidates of (nfam) families, one family at a time
+def family_candidates(nfam, rows, width):
+    for i in range(nfam):
+        yield candidates(rows, 2, family = "FAM%d" % i, width = width, seed = i)
+
+# write the candidates of every family (famresults) to (path) the way main.py
+# does
+def write_in_memory(famresults, path):
+    kept = list(famresults)
+    result = pd.concat(kept).sort_values(SORT_COLUMNS)
+    write_frame(result, path)
+
+# write the candidates of every family (famresults) to (path) with an
+# OutputStream
+def write_streamed(famresults, path):
+    stream = OutputStream(path)
+    for famresult in famresults:
+        stream.add(famresult)
+    stream.close()
+
+# get the bytes of the CSV file in the output file (path), decompressing it
+# as the ending of its name says
+def decompressed(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".gz"):
+        return gzip.decompress(raw)
+    if path.endswith(".bz2"):
+        return bz2.decompress(raw)
+    if path.endswith(".xz"):
+        return lzma.decompress(raw)
+    if path.endswith(".zst"):
+        import zstandard
+        with zstandard.ZstdDecompressor().stream_reader(open(path, "rb")) as reader:
+            return reader.read()
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            names = archive.namelist()
+            assert len(names) == 1
+            return archive.read(names[0])
+    return raw
+
+# check that the candidates of (nfam) families written to a file of every
+# compressed format in the directory (directory), in memory and (except zip
+# files, which cannot be streamed) streamed, decompress to the same bytes as
+# the CSV file (expected)
+def check_compressions(nfam, rows, width, directory, expected):
+    with open(expected, "rb") as f:
+        plain = f.read()
+    for suffix in list(CSV_COMPRESSIONS) + [".zip"]:
+        path = os.path.join(directory, "compressed.csv" + suffix)
+        try:
+            check_output(path)
+        except ValueError as e:
+            print("Skipped", suffix + ":", e)
+            continue
+        writers = [write_in_memory] + ([write_streamed] if suffix != ".zip" else [])
+        for func in writers:
+            func(family_candidates(nfam, rows, width), path)
+            assert decompressed(path) == plain, func.__name__ + " wrote another " + path
+        print("The", suffix, "files decompress to the CSV file.")
+
+# call a function (func) on the candidates of (nfam) families and the path
+# (path), getting the number of seconds it took and the peak of the memory
+# allocated meanwhile in MB. the memory is traced in a second call, as
+# tracing it slows the call down
+def measured(func, nfam, rows, width, path):
+    seconds = timed(func, family_candidates(nfam, rows, width), path)[1]
+
+    tracemalloc.start()
+    func(family_candidates(nfam, rows, width), path)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return seconds, peak
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--families', default="100,300,1000")
+    argp.add_argument('--rows', default=200, type=int, help="candidates per family")
+    argp.add_argument('--width', default=50, type=int,
+                      help="annotation columns in each result")
+    args = argp.parse_args()
+
+    print("{:>8} {:>9} {:>14} {:>14} {:>14} {:>14}".format(
+        "families", "rows", "memory (s)", "memory (MB)", "streamed (s)", "streamed (MB)"))
+    with tempfile.TemporaryDirectory() as directory:
+        expected = os.path.join(directory, "memory.csv")
+        streamed = os.path.join(directory, "streamed.csv")
+        counts = [int(n) for n in args.families.split(",")]
+        for nfam in counts:
+            memory_time, memory_peak = measured(write_in_memory, nfam, args.rows, args.width, expected)
+            stream_time, stream_peak = measured(write_streamed, nfam, args.rows, args.width, streamed)
+            assert filecmp.cmp(expected, streamed, shallow = False)
+            print("{:8d} {:9d} {:14.3f} {:14.1f} {:14.3f} {:14.1f}".format(
+                nfam, nfam * args.rows, memory_time, memory_peak, stream_time, stream_peak))
+        print("The streamed output files are the same as those written in memory.")
+
+        write_in_memory(family_candidates(min(counts), args.rows, args.width), expected)
+        check_compressions(min(counts), args.rows, args.width, directory, expected)
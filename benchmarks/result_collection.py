@@ -0,0 +1,65 @@
+# Benchmark of how the collection of results scales with the number of
+# families.
+#
+# filter_family gets one data frame per inheritance model and subfamily,
+# and main.py gets one data frame per family. This compares growing the
+# results with pd.concat as each data frame arrives (the original approach,
+# which copies everything collected so far every time) with gathering them
+# in lists and concatenating once, for 10 to 1,000 families, checking that
+# both give the same results (see compare in synthetic.py).
+#
+# Run from the repository's directory with:
+#   python benchmarks/result_collection.py
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import candidates, compare
+
+# collect the model results (modelresults) of every family by concatenating
+# each data frame onto the results collected so far
+def collect_incremental(modelresults):
+    result = pd.DataFrame()
+    for family in modelresults:
+        famresult = pd.DataFrame()
+        for modelresult in family:
+            famresult = pd.concat([famresult, modelresult])
+        result = pd.concat([result, famresult])
+    return result
+
+# collect the model results (modelresults) of every family by gathering
+# them in lists and concatenating once per family and once overall
+def collect_lists(modelresults):
+    famresults = []
+    for family in modelresults:
+        famresults.append(pd.concat(family))
+    return pd.concat(famresults)
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--families', default="10,100,1000")
+    argp.add_argument('--models', default=6, type=int,
+                      help="model results per family (6 per subfamily)")
+    argp.add_argument('--rows', default=20, type=int,
+                      help="candidates per model result")
+    argp.add_argument('--width', default=100, type=int,
+                      help="annotation columns in each result")
+    args = argp.parse_args()
+
+    # one template result per model, copied for every family
+    templates = [candidates(args.rows, 1, width = args.width, seed = i)
+                 for i in range(args.models)]
+
+    print("{:>8} {:>9} {:>16} {:>12} {:>8}".format(
+        "families", "rows", "incremental (s)", "lists (s)", "speedup"))
+    for nfam in [int(n) for n in args.families.split(",")]:
+        modelresults = [[template.assign(family="FAM%d" % i) for template in templates]
+                        for i in range(nfam)]
+        result, incremental_time, lists_time = compare(collect_incremental, collect_lists,
+                                                       [modelresults])
+        print("{:8d} {:9d} {:16.3f} {:12.3f} {:7.1f}x".format(
+            nfam, len(result), incremental_time, lists_time, incremental_time / lists_time))
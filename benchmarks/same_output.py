@@ -0,0 +1,95 @@
+# Regression check for the options that must not change the output files:
+# loading only the columns the filters need (--prune-columns, see
+# read_variants in loading.py) and reading the data file a chunk of rows at a
+# time (--chunksize, see read_chunks).
+#
+# Writes a synthetic cohort (see cohort.py) with columns that pandas reads as
+# numbers (see add_numbers), runs main.py on it without any options, with
+# --prune-columns, with --prune-columns --cache both when the cache was made
+# with --prune-columns and when it was made from every column (a later run
+# with --cache), and with --chunksize (by default a quarter of the rows),
+# with and without --prune-columns, and checks that every run writes the same
+# output files, byte for byte. The seconds each run took are printed.
+#
+# Run from the repository's directory with e.g.:
+#   python benchmarks/same_output.py --rows 20000
+
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from cohort import add_cohort_arguments, write_cohort
+
+# the path of main.py
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main.py")
+
+# the runs of main.py: their names and options, where CHUNKSIZE is replaced
+# by the chunk size
+CHUNKSIZE = "CHUNKSIZE"
+RUNS = [("default", []),
+        ("prune", ["--prune-columns"]),
+        ("prune, new cache", ["--prune-columns", "--cache"]),
+        ("prune, pruned cache", ["--prune-columns", "--cache"]),
+        ("full cache", ["--cache"]),
+        ("prune, full cache", ["--prune-columns", "--cache"]),
+        ("chunks", ["--chunksize", CHUNKSIZE]),
+        ("prune, chunks", ["--prune-columns", "--chunksize", CHUNKSIZE])]
+
+# add two columns before the FORMAT column of the variant data file of a
+# cohort (path), which pandas reads as numbers and writes differently from
+# the file: scores (CADD_phred) with two decimals and some missing values
+# (e.g. 0.50 is written as 0.5), and counts (nhomalt) with missing values in
+# the second half of the file only, so that the first chunks have only
+# integers (12 is written as 12.0)
+def add_numbers(path, seed):
+    df = pd.read_csv(path, sep='\t', dtype=str, keep_default_na=False)
+    rng = np.random.default_rng(seed)
+    scores = pd.Series(rng.integers(0, 4000, size=len(df)) / 100).map("{:.2f}".format)
+    scores[rng.random(size=len(df)) < .2] = ""
+    counts = pd.Series(rng.integers(0, 50, size=len(df))).astype(str)
+    counts[(np.arange(len(df)) >= len(df) // 2) & (rng.random(size=len(df)) < .2)] = ""
+    position = df.columns.get_loc("FORMAT")
+    df.insert(position, "nhomalt", counts.values)
+    df.insert(position, "CADD_phred", scores.values)
+    df.to_csv(path, sep='\t', index=False)
+
+# run main.py on the files of a cohort (paths, see write_cohort) with the
+# options (options), writing the output files (outputs).
+# returns the number of seconds it took
+def run(paths, options, outputs):
+    pedfile, phenfile, mapfile, data = paths
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN, "-p", pedfile, "-ph", phenfile, "-m", mapfile,
+                    "-d", data, "-o", outputs[0], "-op", outputs[1], "--quiet"] + options,
+                   check = True, stdout = subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    add_cohort_arguments(argp)
+    argp.add_argument('--chunksize', default=None, type=int,
+                      help="the --chunksize of main.py (a quarter of the rows by default)")
+    args = argp.parse_args()
+    chunksize = str(args.chunksize or max(args.rows // 4, 1))
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_cohort(args, directory)
+        add_numbers(paths[3], args.seed)
+        expected = None
+        for k, (name, options) in enumerate(RUNS):
+            outputs = [os.path.join(directory, "%d%s.csv" % (k, suffix)) for suffix in ["", "_phen"]]
+            options = [chunksize if option == CHUNKSIZE else option for option in options]
+            seconds = run(paths, options, outputs)
+            print("{:>20} {:8.2f} s".format(name, seconds))
+            if expected is None:
+                expected = outputs
+            for path, other in zip(expected, outputs):
+                assert filecmp.cmp(path, other, shallow = False), name + " wrote another " + other
+    print("Every run wrote the same output files.")
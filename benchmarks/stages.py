@@ -0,0 +1,157 @@
+# Benchmark of every stage of a VIA run on a synthetic cohort (see cohort.py),
+# writing the seconds each stage took to a JSON file, so that they can be
+# compared between versions of VIA.
+#
+# The stages are the same steps that main.py takes:
+# - get_families: reading the pedfile
+# - load_phen: reading the phenfile and the mapfile
+# - read_variants: reading the variant data file and checking it with verify
+# - parse_genotypes: decoding the sample columns
+# - index_genes: splitting the genes of the variants for the phenotype filter
+# - each inheritance model in MODELS, for every subfamily of every family.
+#   the masks of the filters (see frame_mask in genotypes.py) are shared, and
+#   counted in the time of the first model that needs each of them
+# - combine_duplicates: combining the variants of the models of each family
+# - filter_phen: the phenotype filter of each family
+# - write_output: sorting and writing both output files
+#
+# Run from the repository's directory with e.g.:
+#   python benchmarks/stages.py --rows 200000 --families 20 --multiplex .5 --json stages.json
+# or, for a cohort written by cohort.py:
+#   python benchmarks/stages.py --cohort cohort --json stages.json
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import *
+from cohort import COHORT_FILES, add_cohort_arguments, write_cohort
+
+# the seconds taken by each stage, in the order they were first timed
+stage_times = {}
+
+# time the code run inside the with statement, adding the seconds it took to
+# the time of the stage (stage)
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    yield
+    stage_times[name] = stage_times.get(name, 0) + time.perf_counter() - start
+
+# get the commit of the repository that is being benchmarked, or None if it
+# is not a git repository
+def commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# run every stage of VIA on the files of a cohort (paths, in the order of
+# COHORT_FILES), writing the output files into the directory (output).
+# returns a tuple of the number of variants and the numbers of candidates
+# without and with the phenotype filter
+def run_stages(paths, output):
+    pedfile, phenfile, mapfile, datafile = paths
+
+    with stage("get_families"):
+        families = get_families(pedfile)
+    with stage("load_phen"):
+        load_phen(families, phenfile, mapfile)
+    samples = [person.ID for fam in families.values() for person in fam.people]
+
+    with stage("read_variants"):
+        df = verify(pd.read_csv(datafile, sep='\t', low_memory=False))
+    with stage("parse_genotypes"):
+        parse_genotypes(df, samples)
+    with stage("index_genes"):
+        index_genes(df["Gene.refGene"])
+
+    famresults = []
+    famresults_p = []
+    for fam in families.values():
+        subfamilies = generate_subfamilies(fam)
+        plan = plan_models(subfamilies, include_singleton = True)
+        def run(i, s):
+            with stage(MODELS[i].__name__):
+                return run_model(i, df, subfamilies[s], include_singleton = True)
+        subfamresults = planned_results(plan, subfamilies, run)
+
+        # the results without and with the phenotype filter, as in
+        # combine_results_both
+        modelresults = []
+        modelresults_p = []
+        for subfam, results in zip(subfamilies, subfamresults):
+            modelresults_p += results
+            if not subfam.hasFather and not subfam.hasMother:
+                results = [pd.DataFrame() if i in SINGLETON_MODELS else result
+                           for i, result in enumerate(results)]
+            modelresults += results
+
+        with stage("combine_duplicates"):
+            famresults.append(combine_duplicates(pd.concat(modelresults)))
+            famresult_p = combine_duplicates(pd.concat(modelresults_p))
+        with stage("filter_phen"):
+            famresults_p.append(filter_phen(famresult_p, fam))
+
+    with stage("write_output"):
+        result = pd.concat(famresults).sort_values(['sample', 'inh model'])
+        result_p = pd.concat(famresults_p).sort_values(['family', 'phens_matched', 'sample'])
+        result.to_csv(os.path.join(output, "filtered.csv"))
+        result_p.to_csv(os.path.join(output, "filtered_phen.csv"))
+
+    return len(df), len(result), len(result_p)
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    add_cohort_arguments(argp)
+    argp.add_argument('--cohort', default=None,
+                      help="a directory written by cohort.py, instead of generating one")
+    argp.add_argument('--json', default="stages.json")
+    args = argp.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.cohort is not None:
+            paths = [os.path.join(args.cohort, name) for name in COHORT_FILES]
+        else:
+            print("Generating the cohort...")
+            paths = write_cohort(args, tmp)
+
+        # the output of the models is not part of the benchmark
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            variants, candidates, candidates_p = run_stages(paths, tmp)
+
+    print("{:>20} {:>10}".format("stage", "seconds"))
+    for name, seconds in stage_times.items():
+        print("{:>20} {:10.3f}".format(name, seconds))
+    print("{:>20} {:10.3f}".format("total", sum(stage_times.values())))
+
+    results = {
+        "commit": commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cohort": args.cohort if args.cohort is not None else
+                  {key: value for key, value in vars(args).items()
+                   if key not in ("cohort", "json")},
+        "variants": variants,
+        "candidates": candidates,
+        "candidates_phen": candidates_p,
+        "stages": stage_times,
+        "total": sum(stage_times.values()),
+    }
+    with open(args.json, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Wrote", args.json)
@@ -0,0 +1,83 @@
+# Regression check and benchmark for sharing model results between the
+# subfamilies of a family (subfamily_results in utils.py).
+#
+# Generates a variant data frame (by default 200,000 variants, a tenth of
+# them on chrX) for multiplex families with both parents and 2 to 8 affected
+# children, and compares subfamily_results with running every inheritance
+# model for every subfamily (see compare in synthetic.py) once the masks of
+# the filters (see frame_mask in genotypes.py) have been computed.
+#
+# Run from the repository's directory with:
+#   python benchmarks/subfamilies.py
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from family import Family, Person
+from genotypes import parse_genotypes
+from utils import *
+from synthetic import compare, variants
+
+# make a Family object (ID) with both parents and (affected) affected
+# children, the first of whom is the child
+def multiplex(ID, affected):
+    fam = Family(ID)
+    fam.father = Person(ID + "-1", "Male", "Unaffected")
+    fam.mother = Person(ID + "-2", "Female", "Unaffected")
+    fam.hasFather = fam.hasMother = True
+    children = [Person(ID + "-" + str(i + 3), "Male" if i % 2 == 0 else "Female", "Affected")
+                for i in range(affected)]
+    fam.child = children[0]
+    fam.siblings = children[1:]
+    fam.people = [fam.father, fam.mother] + children
+    return fam
+
+# run every inheritance model for every subfamily of the Family object (fam)
+# in a dataframe of variants (df)
+def every_model(df, fam):
+    return [model_results(df, subfam, include_singleton = True)
+            for subfam in generate_subfamilies(fam)]
+
+# share the model results between the subfamilies of the Family object
+# (fam) in a dataframe of variants (df), getting the results and the plan
+def shared_models(df, fam):
+    return subfamily_results(df, generate_subfamilies(fam), include_singleton = True)
+
+# check that the results shared between subfamilies (result, with their
+# plan) are the same as running every model for every subfamily (expected)
+def same_results(result, expected):
+    for results, expected_results in zip(result[0], expected):
+        for model_result, expected_result in zip(results, expected_results):
+            if expected_result is None:
+                assert model_result is None
+            else:
+                pd.testing.assert_frame_equal(model_result, expected_result)
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--rows', default=200000, type=int)
+    argp.add_argument('--genes', default=18000, type=int)
+    argp.add_argument('--seed', default=0, type=int)
+    args = argp.parse_args()
+
+    families = [multiplex("FAM" + str(n), n) for n in [2, 4, 8]]
+    samples = [person.ID for fam in families for person in fam.people]
+    df = variants(args.rows, args.genes, samples, seed = args.seed, chrx = .1)
+    parse_genotypes(df, samples)
+
+    print("{:>8} {:>7} {:>7} {:>12} {:>11} {:>8}".format(
+        "family", "models", "shared", "every (s)", "shared (s)", "speedup"))
+    for fam in families:
+        # compute the masks of the filters first, which both share
+        every_model(df, fam)
+        (result, plan), every_time, shared_time = compare(every_model, shared_models, [df, fam],
+                                                          check = same_results)
+        shared = sum(planned != s for s, models in enumerate(plan) for planned in models)
+        print("{:>8} {:7d} {:7d} {:12.3f} {:11.3f} {:7.1f}x".format(
+            fam.ID, len(plan) * len(MODELS), shared, every_time, shared_time,
+            every_time / shared_time))
+    print("subfamily_results matches running every model for every subfamily.")
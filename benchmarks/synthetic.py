@@ -0,0 +1,202 @@
+# Generators of synthetic data for the benchmarks: candidate and variant data
+# frames, and the pedigree, phenotype, mapping and variant data files of a
+# synthetic cohort (see cohort.py). Also the timing of a function against
+# its original implementation (see compare), which the regression checks
+# share.
+
+import time
+
+import numpy as np
+import pandas as pd
+
+# call a function (func) with the arguments (args), getting a tuple of its
+# result and the number of seconds it took
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+# call the original implementation of a function (original) and the current
+# one (current) with the arguments (args), each with its own copy of the data
+# frames among them if copy is True (for functions that change them), and
+# check that they give the same result with the function (check), which is
+# given the current and the original result.
+# returns a tuple of the current result and the number of seconds the
+# original and the current implementation took
+def compare(original, current, args, check = pd.testing.assert_frame_equal, copy = False):
+    def arguments():
+        return [arg.copy() if copy and isinstance(arg, pd.DataFrame) else arg for arg in args]
+    expected, original_time = timed(original, *arguments())
+    result, current_time = timed(current, *arguments())
+    check(result, expected)
+    return result, original_time, current_time
+
+# generate a candidate data frame with (n) rows over roughly (n / dup)
+# distinct locations, in the column layout that add_columns produces, for
+# the family (family). (width) extra annotation columns are added to mimic
+# the width of the ANNOVAR output
+def candidates(n, dup, family = "FAM1", width = 0, seed = 0):
+    rng = np.random.default_rng(seed)
+    nlocs = max(n // dup, 1)
+    # separate the position ranges of the chromosomes, so that two distinct
+    # locations never give the same location string in the original
+    # implementation of combine_duplicates
+    chroms = np.array(["chr1", "chr2", "chrX"])
+    chrom = rng.integers(0, len(chroms), size=nlocs)
+    start = chrom * 10 ** 8 + rng.integers(10 ** 6, 10 ** 7, size=nlocs)
+    end = start + rng.integers(0, 3, size=nlocs)
+    loc = rng.integers(0, nlocs, size=n)
+    df = pd.DataFrame({
+        "inh model": rng.choice(["ad", "ar", "xl", "xldn", "addn", "ch"], size=n),
+        "family": family,
+        "sample": rng.choice([family + "-3", family + "-4", family + "-5"], size=n),
+        "Chr": chroms[chrom[loc]],
+        "Start": start[loc],
+        "End": end[loc],
+        "Gene.refGene": ["G%d" % i for i in loc],
+        "AF": rng.random(size=n),
+    })
+    annotations = pd.DataFrame({"Annotation%d" % i: rng.choice([".", "exonic", "0.25"], size=n)
+                                for i in range(width)})
+    df = pd.concat([df, annotations], axis=1)
+    # the models keep the row labels of the variant data frame
+    df.index = rng.integers(0, 10 * n, size=n)
+    return df
+
+# generate a variant data frame with (n) rows over (ngenes) genes, in the
+# column layout of the cleaned data file, with a sample column for each of
+# the samples (samples). the variants of each gene are next to each other,
+# as in a data file sorted by position, and a tenth of the rows list a
+# second gene in Gene.refGene.
+# a share (chrx) of the variants, at the end, are put on chrX, where half of
+# the calls of every sample are hemizygous (e.g. 1:)
+def variants(n, ngenes, samples, seed = 0, chrx = 0):
+    rng = np.random.default_rng(seed)
+    gene = np.sort(rng.integers(0, ngenes, size=n))
+    genes = np.array(["G%d" % i for i in gene], dtype=object)
+    second = rng.random(size=n) < .1
+    genes[second] = [g + ";G%d" % rng.integers(ngenes) for g in genes[second]]
+    start = np.sort(rng.integers(10 ** 6, 10 ** 8, size=n))
+    df = pd.DataFrame({
+        "Chr": "chr1",
+        "Start": start,
+        "End": start,
+        "Gene.refGene": genes,
+        "CLNSIG": rng.choice([".", "Benign", "Pathogenic"], size=n),
+        "AF": rng.choice([".", "0", "0.0001", "0.01", "0.3"], size=n),
+        "FORMAT": "GT:AD:DP:GQ:PL",
+    })
+    # mostly reference calls, as in a joint-called cohort
+    calls = np.array(["0/0", "0/1", "1/1", "./."])
+    for sample in samples:
+        gt = calls[rng.choice(len(calls), size=n, p=[.6, .3, .08, .02])]
+        df[sample] = [g + ":10,8:18:99:200,0,300" for g in gt]
+
+    x = np.arange(n) >= n - int(n * chrx)
+    if x.any():
+        df.loc[x, "Chr"] = "chrX"
+        hemi = np.array(["0:18:99", "1:18:99"])
+        for sample in samples:
+            calls = df.loc[x, sample].values
+            half = rng.random(size=len(calls)) < .5
+            calls[half] = hemi[rng.choice(len(hemi), size=half.sum(), p=[.7, .3])]
+            df.loc[x, sample] = calls
+    return df
+
+# generate a pedigree data frame, in the layout of the pedfile, for
+# (families) families. a share (multiplex) of them have (affected) affected
+# children and an unaffected one, and the others are trios of unaffected
+# parents and an affected child
+def pedigree(families, multiplex = 0, affected = 3, seed = 0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for f in range(families):
+        ID = "FAM%d" % f
+        rows.append((ID, ID + "-1", "Father", "Male", "Unaffected"))
+        rows.append((ID, ID + "-2", "Mother", "Female", "Unaffected"))
+        children = affected if f < round(families * multiplex) else 1
+        for c in range(children):
+            sex = "Male" if rng.random() < .5 else "Female"
+            rows.append((ID, ID + "-" + str(c + 3), "Child" if c == 0 else "Sibling",
+                         sex, "Affected"))
+        if children > 1:
+            sex = "Male" if rng.random() < .5 else "Female"
+            rows.append((ID, ID + "-" + str(children + 3), "Sibling", sex, "Unaffected"))
+    return pd.DataFrame(rows, columns=["Family_ID", "individual_ID", "Status", "Sex", "Phenotype"])
+
+# generate a variant data frame with (n) rows over (ngenes) genes, in the
+# column layout of the ANNOVAR output VIA reads, with a sample column for
+# everyone in the pedigree data frame (ped). a share (chrx) of the variants,
+# at the end, are on chrX, where the calls of the males are hemizygous
+def annovar_variants(n, ngenes, ped, chrx = .05, seed = 0):
+    rng = np.random.default_rng(seed)
+    nx = int(n * chrx)
+    xgenes = max(int(ngenes * chrx), 1)
+
+    # the genes, and the chromosome of each, in the order of the file
+    gene = np.concatenate([np.sort(rng.integers(0, ngenes - xgenes, size=n - nx)),
+                           np.sort(rng.integers(ngenes - xgenes, ngenes, size=nx))])
+    chrom = np.array(["chr%d" % (1 + g * 22 // (ngenes - xgenes)) for g in gene[:n - nx]] +
+                     ["chrX"] * nx, dtype=object)
+    start = gene * 50000 + np.sort(rng.integers(0, 50000, size=n))
+    genes = np.array(["G%d" % g for g in gene], dtype=object)
+    second = rng.random(size=n) < .1
+    genes[second] = [g + ";G%d" % rng.integers(ngenes) for g in genes[second]]
+
+    bases = np.array(list("ACGT"))
+    ref = rng.integers(0, 4, size=n)
+    df = pd.DataFrame({
+        "Chr": chrom,
+        "Start": start,
+        "End": start,
+        "Ref": bases[ref],
+        "Alt": bases[(ref + rng.integers(1, 4, size=n)) % 4],
+        "Func.refGene": rng.choice(["exonic", "intronic", "splicing", "UTR3"], size=n),
+        "Gene.refGene": genes,
+        "CLNSIG": rng.choice([".", "Benign", "Likely_benign", "Pathogenic"], size=n),
+    })
+    for col in ["AF", "Kaviar_AF", "gnomad41_exome_AF_grpmax"]:
+        df[col] = rng.choice([".", "0", "0.0001", "0.0004", "0.003", "0.01", "0.3"], size=n,
+                             p=[.3, .2, .15, .1, .1, .1, .05])
+    df["FORMAT"] = "GT:AD:DP:GQ:PL"
+
+    calls = np.array(["0/0", "0/1", "1/1", "./."])
+    x = np.arange(n) >= n - nx
+    for person in ped.itertuples():
+        gt = calls[rng.choice(len(calls), size=n, p=[.55, .35, .08, .02])]
+        if person.Sex == "Male":
+            gt[x] = np.array(["0", "1"])[(rng.random(size=nx) < .3).astype(int)]
+        refdepth = rng.integers(0, 30, size=n)
+        altdepth = rng.integers(0, 30, size=n)
+        df[person.individual_ID] = (pd.Series(gt) + ":" + pd.Series(refdepth).astype(str) + "," +
+                                    pd.Series(altdepth).astype(str) + ":" +
+                                    pd.Series(refdepth + altdepth).astype(str) + ":99:0,30,300")
+    df["Otherinfo"] = "."
+    return df
+
+# generate a phenotype-to-gene mapping data frame, in the layout of the
+# mapfile, mapping each of (terms) HPO numbers to (genes) of (ngenes) genes
+def hpo_map(terms, ngenes, genes = 50, seed = 0):
+    rng = np.random.default_rng(seed)
+    hpo = np.repeat(["HP:%07d" % (t + 1) for t in range(terms)], genes)
+    gene = rng.integers(0, ngenes, size=terms * genes)
+    return pd.DataFrame({
+        "HPO-id": hpo,
+        "HPO label": "label",
+        "entrez-gene-id": gene,
+        "entrez-gene-symbol": ["G%d" % g for g in gene],
+        "Additional Info": "-",
+        "G-D source": "mim2gene",
+        "disease-ID": "OMIM:1",
+    })
+
+# generate a phenotype data frame, in the layout of the phenfile, giving
+# every family of the pedigree data frame (ped) one to three of (terms) HPO
+# numbers
+def phenotypes(ped, terms, seed = 0):
+    rng = np.random.default_rng(seed)
+    families = ped["Family_ID"].unique()
+    hpos = [",".join("HP:%07d" % (t + 1) for t in
+                     rng.choice(terms, size=rng.integers(1, 4), replace=False))
+            for fam in families]
+    return pd.DataFrame({"Family_ID": families, "HPO": hpos})
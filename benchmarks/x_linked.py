@@ -0,0 +1,125 @@
+# Regression check and benchmark for xl_model and xldn_model in models.py.
+#
+# Generates a variant data frame (by default 200,000 variants, a tenth of
+# them on chrX) for a family with an affected son and unaffected parents, one
+# with an affected father and an unaffected mother, and one with an affected
+# son and an unaffected brother, and compares xl_model and xldn_model with
+# the original implementations, which append the rows of every genotype of
+# every person to each other (see compare in synthetic.py). The original
+# implementations can keep a variant more than once, so only the first of
+# each is compared.
+#
+# Run from the repository's directory with:
+#   python benchmarks/x_linked.py
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from family import Family, Person
+from genotypes import parse_genotypes
+from models import *
+from synthetic import compare, variants
+
+# DataFrame.append is not in pandas 2, where it is the same as concatenating
+def append(df, other):
+    return pd.concat([df, other])
+
+# the original implementation of xl_model
+def xl_loop(df, fam):
+    newdf = df.copy()
+    x_df = filter_chr(newdf, "chrX")
+    for person in fam.people:
+        if person.affected:
+            if not person.male:
+                return pd.DataFrame()
+            x_df_1 = filter_zyg(x_df, person.ID, "1/1")
+            x_df_2 = filter_1x_zyg(x_df, person.ID, "1:")
+            x_df = append(x_df_1, x_df_2)
+        if person.unaffected:
+            x_df_1 = exclude_zyg(x_df, person.ID, "1/1")
+            x_df_2 = exclude_1x_zyg(x_df, person.ID, "1:")
+            x_df = append(x_df_1, x_df_2)
+            if person.male:
+                x_df_1 = filter_zyg(x_df, person.ID, "0/0")
+                x_df_2 = filter_1x_zyg(x_df, person.ID, "0:")
+                x_df = append(x_df_1, x_df_2)
+    if not fam.father.affected:
+        x_df = filter_zyg(x_df, fam.mother.ID, "0/1")
+
+    add_columns(x_df, fam, "xl")
+    return(x_df)
+
+# the original implementation of xldn_model
+def xldn_loop(df, fam):
+    newdf = df.copy()
+    x_df = filter_chr(newdf, "chrX")
+    if fam.mother.affected or fam.father.affected:
+        return pd.DataFrame()
+    if fam.child.female:
+        return pd.DataFrame()
+    for person in fam.people:
+        if person.affected:
+            if not person.male:
+                return pd.DataFrame()
+            x_df_1 = filter_zyg(x_df, person.ID, "1/1")
+            x_df_2 = filter_1x_zyg(x_df, person.ID, "1:")
+            x_df = append(x_df_1, x_df_2)
+        if person.unaffected:
+            x_df_1 = filter_zyg(x_df, person.ID, "0/0")
+            x_df_2 = filter_1x_zyg(x_df, person.ID, "0:")
+            x_df = append(x_df_1, x_df_2)
+    add_columns(x_df, fam, "xldn")
+    return(x_df)
+
+# make a Family object (ID) with the people (people), a list of tuples of
+# the number of their sample, their sex and their phenotype, e.g.
+# (1, "Male", "Unaffected") for the father. the first of them is the child
+def family(ID, people):
+    fam = Family(ID)
+    for number, sex, phenotype in people:
+        person = Person(ID + "-" + str(number), sex, phenotype)
+        fam.people.append(person)
+        if number == 1:
+            fam.father = person
+            fam.hasFather = True
+        elif number == 2:
+            fam.mother = person
+            fam.hasMother = True
+    fam.child = fam.people[0]
+    return fam
+
+# check that a data frame (result) has the same variants in the same order
+# as the output of an original implementation (expected), counting each of
+# the variants it kept more than once only the first time
+def same_variants(result, expected):
+    pd.testing.assert_frame_equal(result, expected[~expected.index.duplicated()])
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--rows', default=200000, type=int)
+    argp.add_argument('--genes', default=18000, type=int)
+    argp.add_argument('--chrx', default=.1, type=float)
+    argp.add_argument('--seed', default=0, type=int)
+    args = argp.parse_args()
+
+    families = [family("TRIO", [(3, "Male", "Affected"), (1, "Male", "Unaffected"),
+                                (2, "Female", "Unaffected")]),
+                family("FATHER", [(3, "Male", "Affected"), (1, "Male", "Affected"),
+                                  (2, "Female", "Unaffected")]),
+                family("BROTHER", [(3, "Male", "Affected"), (4, "Male", "Unaffected")])]
+    samples = [person.ID for fam in families for person in fam.people]
+    df = variants(args.rows, args.genes, samples, seed = args.seed, chrx = args.chrx)
+    parse_genotypes(df, samples)
+
+    print("{:>8} {:>5} {:>8} {:>10} {:>10} {:>8}".format(
+        "family", "model", "rows", "append (s)", "masks (s)", "speedup"))
+    for fam in families:
+        for name, loop, model in [("xl", xl_loop, xl_model), ("xldn", xldn_loop, xldn_model)]:
+            result, loop_time, mask_time = compare(loop, model, [df, fam], check = same_variants)
+            print("{:>8} {:>5} {:8d} {:10.3f} {:10.3f} {:7.1f}x".format(
+                fam.ID, name, len(result), loop_time, mask_time, loop_time / mask_time))
+    print("xl_model and xldn_model match the original implementations.")
@@ -0,0 +1,366 @@
+# This file is for caching the loaded variant data frame next to the data
+# file, so that later runs against the same file do not have to parse the
+# text again.
+#
+# The cache is a directory named after the data file (e.g.
+# Test_cleaned.txt.viacache) containing:
+# - frame.pkl: the verified variant data frame
+# - genotypes.npy, depths.npy, allele_ratios.npy: the decoded sample columns
+#   (see genotypes.py), one row per sample, loaded memory-mapped
+# - key.json: what the cache was made from (the size, modification time and
+#   content hash of the data file), the decoded samples and the columns of
+#   the data frame
+#
+# The cache is used if the data file has the same size and modification time
+# as when the cache was made. If only the modification time differs (e.g. the
+# file was copied or touched), the content hash decides.
+#
+# The index of HPO numbers to genes read from the phenotype-to-gene mapping
+# file (see read_mapfile in utils.py) is cached the same way, in a single
+# file next to the mapfile (e.g. phenotype_to_genes.txt.hpoindex).
+#
+# The results of each family can also be kept in a result cache directory
+# (--result-cache), so that a later run only filters the families whose
+# results may have changed. The result of a family is used if it was made
+# from the same contents of the data file, with the same loaded columns, the
+# same pedigree rows, the same regions file (--regions), the same storage
+# (--compact), and (with the phenotype filter) the same HPO numbers and genes
+# of the family, by the same code of VIA and version of pandas.
+
+import hashlib
+import json
+import os
+import pickle
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+from genotypes import *
+
+# increase when the cached data or the way it is decoded changes, so that
+# older caches are not used
+CACHE_VERSION = 3
+
+# the decoded sample column files, in the order of parsed_genotypes()
+DECODED_FILES = ["genotypes.npy", "depths.npy", "allele_ratios.npy"]
+
+# get the path of the cache directory for a data file (path)
+def cache_path(path):
+    return path + ".viacache"
+
+# get the size and modification time of a file (path)
+def file_key(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+# get the SHA-1 hash of the contents of a file (path)
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+# write a file (path) with the function (write), which is given the path to
+# write to. goes through a temporary file, so that an interrupted write does
+# not leave a broken cache file
+def write_atomic(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+# read the key of the cache for a data file (path), or None if there is no
+# usable cache
+def read_key(path):
+    keyfile = os.path.join(cache_path(path), "key.json")
+    if not os.path.isfile(keyfile):
+        return None
+    with open(keyfile) as f:
+        key = json.load(f)
+    if key.get("version") != CACHE_VERSION:
+        return None
+    return key
+
+# check whether the cache with the key (key) was made from the current
+# contents of the file (path). if only the modification time of the file
+# changed, the key is updated and saved with the function (save)
+def is_valid(path, key, save):
+    current = file_key(path)
+    if current["size"] != key["size"]:
+        return False
+    if current["mtime"] == key["mtime"]:
+        return True
+
+    # the file was modified or copied since the cache was made: the cache is
+    # still valid if the contents are the same
+    if file_hash(path) != key["hash"]:
+        return False
+    # remember the new modification time, so the hash is not needed next time
+    key["mtime"] = current["mtime"]
+    save(key)
+    return True
+
+# write the key (key) of the cache for a data file (path)
+def write_key(path, key):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(key, f)
+    write_atomic(os.path.join(cache_path(path), "key.json"), write)
+
+# write the decoded sample columns (parsed), as returned by parsed_genotypes,
+# into the cache for a data file (path).
+# each is stored with one row per sample, so that reading a sample only
+# touches its own part of the memory-mapped file
+def write_decoded(path, parsed):
+    for decoded, filename in zip(parsed, DECODED_FILES):
+        values = np.ascontiguousarray(decoded.values.T)
+        def write(tmp):
+            with open(tmp, "wb") as f:
+                np.save(f, values)
+        write_atomic(os.path.join(cache_path(path), filename), write)
+
+# read the decoded sample columns of the samples (names) from the cache for
+# a data file (path), memory-mapped, for the rows of the variant data frame
+# (df)
+def read_decoded(path, names, df):
+    parsed = []
+    for filename in DECODED_FILES:
+        values = np.load(os.path.join(cache_path(path), filename), mmap_mode="r")
+        parsed.append(pd.DataFrame(values.T, index=df.index, columns=names, copy=False))
+    return tuple(parsed)
+
+# save the verified variant data frame (df) and its decoded sample columns
+# (see parse_genotypes) in the cache for a data file (path)
+def save_cache(path, df):
+    try:
+        os.makedirs(cache_path(path), exist_ok=True)
+    except OSError as e:
+        print("Could not create the cache for", path + ":", e)
+        return
+
+    # remove the key first, so that a partly written cache is never used
+    keyfile = os.path.join(cache_path(path), "key.json")
+    if os.path.isfile(keyfile):
+        os.remove(keyfile)
+
+    key = file_key(path)
+    key["hash"] = file_hash(path)
+    key["version"] = CACHE_VERSION
+
+    write_atomic(os.path.join(cache_path(path), "frame.pkl"),
+                 lambda tmp: df.to_pickle(tmp, compression=None, protocol=4))
+    parsed = parsed_genotypes()
+    write_decoded(path, parsed)
+    key["samples"] = list(parsed[0].columns)
+    key["columns"] = list(df.columns)
+    write_key(path, key)
+
+# load the verified variant data frame of a data file (path) from its cache,
+# and restore the decoded sample columns, decoding any of the samples (names)
+# that are not in the cache yet.
+# returns None if there is no valid cache for the data file, or the cache
+# does not have all of the columns (columns), e.g. because it was made with
+# --prune-columns
+def load_cache(path, names, columns):
+    key = read_key(path)
+    if key is None or not set(columns) <= set(key["columns"]):
+        return None
+    if not is_valid(path, key, lambda key: write_key(path, key)):
+        return None
+
+    df = pd.read_pickle(os.path.join(cache_path(path), "frame.pkl"), compression=None)
+    parsed = read_decoded(path, key["samples"], df)
+
+    # decode the samples that were added to the pedigree since the cache was
+    # made, and add them to the cache
+    missing = [name for name in dict.fromkeys(names)
+               if name in df.columns and name not in key["samples"]]
+    if len(missing) > 0:
+        parsed = tuple(pd.concat([cached, new], axis=1)
+                       for cached, new in zip(parsed, decode_samples(df, missing)))
+        write_decoded(path, parsed)
+        key["samples"] = list(parsed[0].columns)
+        write_key(path, key)
+
+    restore_genotypes(parsed)
+    return df
+
+# get the path of the cache of the HPO index of a mapfile (path)
+def index_path(path):
+    return path + ".hpoindex"
+
+# save the HPO index (index) of a mapfile (path) in its cache, with the key
+# (key) of the mapfile, or a new one
+def save_index(path, index, key = None):
+    if key is None:
+        key = file_key(path)
+        key["hash"] = file_hash(path)
+        key["version"] = CACHE_VERSION
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            pickle.dump({"key": key, "index": index}, f, protocol=4)
+    try:
+        write_atomic(index_path(path), write)
+    except OSError as e:
+        print("Could not create the cache for", path + ":", e)
+
+# load the HPO index of a mapfile (path) from its cache.
+# returns None if there is no valid cache for the mapfile
+def load_index(path):
+    if not os.path.isfile(index_path(path)):
+        return None
+    with open(index_path(path), "rb") as f:
+        cached = pickle.load(f)
+
+    key = cached["key"]
+    if key.get("version") != CACHE_VERSION:
+        return None
+    if not is_valid(path, key, lambda key: save_index(path, cached["index"], key)):
+        return None
+    return cached["index"]
+
+# the hash of the code of VIA, see code_hash
+_code_hash = None
+
+# get the SHA-1 hash of the code of VIA (the .py files next to this one), so
+# that results cached by another version of VIA are not used
+def code_hash():
+    global _code_hash
+    if _code_hash is None:
+        sha1 = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".py"):
+                sha1.update(name.encode())
+                sha1.update(file_hash(os.path.join(directory, name)).encode())
+        _code_hash = sha1.hexdigest()
+    return _code_hash
+
+# get the hash of the contents of a data file (path), keeping it in the
+# result cache directory (directory) with the size and modification time of
+# the file, so that it is only computed again when the file changes
+def data_hash(directory, path):
+    keyfile = os.path.join(directory, "data.json")
+    keys = {}
+    if os.path.isfile(keyfile):
+        with open(keyfile) as f:
+            keys = json.load(f)
+
+    name = os.path.abspath(path)
+    key = keys.get(name)
+    if key is None or not is_valid(path, key, lambda key: None):
+        key = file_key(path)
+        key["hash"] = file_hash(path)
+    keys[name] = key
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(keys, f)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        write_atomic(keyfile, write)
+    except OSError as e:
+        print("Could not create the cache for", path + ":", e)
+    return key["hash"]
+
+# get the key of the cached results of the Family object (fam), filtered
+# with the phenotype filter if phen is True, for the variants of a data file
+# with the hash (data) loaded with the columns (columns), and pruned if
+# prune_columns is True, in the regions of a regions file with the hash
+# (regions), or None, and in compact storage if compact is True
+def family_key(fam, data, columns, prune_columns, phen, regions = None, compact = False):
+    key = {"code": code_hash(), "pandas": pd.__version__, "data": data,
+           "columns": columns, "prune_columns": prune_columns, "regions": regions,
+           "compact": compact,
+           "family": fam.ID,
+           "people": [[person.ID, person.sex, person.phen] for person in fam.people],
+           "father": fam.father.ID if fam.hasFather else None,
+           "mother": fam.mother.ID if fam.hasMother else None,
+           "child": fam.child.ID, "siblings": [person.ID for person in fam.siblings]}
+    if phen:
+        key["HPO"] = fam.HPO
+        key["genes"] = list(fam.genes.items())
+    # IDs read as numbers from the pedfile are numpy integers
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+# get a dict of the IDs of the Family objects in (families) and the keys of
+# their results without and, if phen is True, with the phenotype filter (else
+# None), for the variants of the data file (path) loaded with the columns
+# (columns), and pruned if prune_columns is True, in the regions of the
+# regions file (regions, see read_regions) if it is not None, and in compact
+# storage if compact is True (whose results hold hashes of the sample
+# strings, see compact.py).
+# the hash of the data file is kept in the result cache directory (directory)
+def result_keys(directory, path, families, columns, prune_columns, phen, regions = None,
+                compact = False):
+    data = data_hash(directory, path)
+    if regions is not None:
+        regions = file_hash(regions)
+    return {fam.ID: (family_key(fam, data, columns, prune_columns, False, regions, compact),
+                     family_key(fam, data, columns, prune_columns, True, regions, compact) if phen else None)
+            for fam in families}
+
+# get the path of the cached result of the family with the ID (ID) in the
+# result cache directory (directory), with the phenotype filter if phen is
+# True
+def result_path(directory, ID, phen):
+    name = urllib.parse.quote(str(ID), safe="")
+    return os.path.join(directory, name + (".phen.pkl" if phen else ".pkl"))
+
+# load the result of the family with the ID (ID), with the phenotype filter if
+# phen is True, from the result cache directory (directory).
+# returns None if it is not in the cache or was cached with another key (key)
+def load_result(directory, ID, phen, key):
+    path = result_path(directory, ID, phen)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        # the key is read first, so results pickled by another version of
+        # pandas are never read
+        if pickle.load(f) != key:
+            return None
+        return pickle.load(f)
+
+# save the result (result) of the family with the ID (ID), with the phenotype
+# filter if phen is True, in the result cache directory (directory) with its
+# key (key)
+def save_result(directory, ID, phen, key, result):
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            pickle.dump(key, f, protocol=4)
+            pickle.dump(result, f, protocol=4)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        write_atomic(result_path(directory, ID, phen), write)
+    except OSError as e:
+        print("Could not cache the results of", ID, "in", directory + ":", e)
+
+# load the results of the families with the keys (keys, see result_keys) from
+# the result cache directory (directory).
+# returns a dict of the IDs of the families whose results are all cached and
+# a tuple of their results without and with the phenotype filter (None if
+# the keys have no phenotype filter)
+def load_results(directory, keys):
+    results = {}
+    for ID, (key, key_p) in keys.items():
+        result = load_result(directory, ID, False, key)
+        if result is None:
+            continue
+        result_p = None
+        if key_p is not None:
+            result_p = load_result(directory, ID, True, key_p)
+            if result_p is None:
+                continue
+        results[ID] = (result, result_p)
+    return results
+
+# save the results of the families with the keys (keys, see result_keys) in
+# the result cache directory (directory), from a dict of family IDs and
+# tuples of their results without and with the phenotype filter (results)
+def save_results(directory, keys, results):
+    for ID, (result, result_p) in results.items():
+        key, key_p = keys[ID]
+        save_result(directory, ID, False, key, result)
+        if key_p is not None:
+            save_result(directory, ID, True, key_p, result_p)
@@ -0,0 +1,182 @@
+# This file is for the compact storage of the variant data frame (--compact).
+#
+# The sample columns of the data file (e.g. "0/1:10,8:18:99:200,0,300") take
+# most of the memory of the loaded variants, as one Python string per
+# variant and sample, although the filters only need the decoded genotypes,
+# read depths and allele depth ratios (see genotypes.py). In compact storage:
+# - the decoded genotypes are int8, the read depths uint16 (depths above
+#   65535 are read as 65535) and the allele depth ratios float32
+# - each sample column of the data frame holds a 64-bit hash of its string
+#   instead of the string, so that rows with the same strings still have the
+#   same values (see drop_duplicated_rows in filters.py)
+# - the strings themselves are kept in a side store: temporary files that
+#   are memory-mapped, holding the UTF-8 bytes of every string and where
+#   each one starts and how long it is, by row and sample column. The
+#   strings of the candidates are read back from it when the output is
+#   written (see expand_samples and join_columns in loading.py)
+# The temporary files are made in the directory for temporary files (e.g.
+# $TMPDIR) and removed when VIA exits.
+
+import tempfile
+
+import numpy as np
+import pandas as pd
+from vcf import *
+
+# the side store of the sample strings of the variant data frame that was
+# last loaded in compact storage, or None: the compacted sample columns
+# ("columns"), the row of each variant in the data file in the order of the
+# store ("labels"), and the memory-mapped arrays of the start ("starts") and
+# length ("lengths", -1 for a missing string) of every string in the bytes
+# ("blob"), with a row per variant and a column per sample column
+_store = None
+
+# get the columns after FORMAT among the columns of a variant data frame
+# (columns)
+def format_columns(columns):
+    columns = list(columns)
+    if "FORMAT" not in columns:
+        return []
+    return columns[columns.index("FORMAT") + 1:]
+
+# get the sample columns among the columns (columns) of the variant data file
+# (path): those after FORMAT, but for the INFO fields that a VCF file gets
+# after its samples (e.g. AF.1, see vcf.py)
+def sample_columns(path, columns):
+    samples = format_columns(columns)
+    if is_vcf(path):
+        names = set(read_vcf_header(path)[1])
+        samples = [col for col in samples if col in names]
+    return samples
+
+# start a new, empty side store for the sample columns (columns), dropping
+# the previous one
+def open_store(columns):
+    global _store
+    _store = {"columns": list(columns), "labels": [], "rows": 0, "size": 0,
+              "files": {name: tempfile.TemporaryFile() for name in ["blob", "starts", "lengths"]}}
+
+# drop the side store, e.g. before loading variants without compact storage
+def clear_store():
+    global _store
+    _store = None
+
+# map the side store that was written by compact_chunk, once every chunk is
+# in it
+def close_store():
+    ncols = len(_store["columns"])
+    _store["labels"] = np.concatenate(_store["labels"] or [np.array([], dtype=np.int64)])
+    shapes = {"blob": (_store["size"],), "starts": (_store["rows"], ncols),
+              "lengths": (_store["rows"], ncols)}
+    dtypes = {"blob": np.uint8, "starts": np.int64, "lengths": np.int32}
+    for name, f in _store["files"].items():
+        f.flush()
+        if np.prod(shapes[name]) == 0:
+            # an empty file cannot be mapped
+            _store[name] = np.zeros(shapes[name], dtype=dtypes[name])
+        else:
+            _store[name] = np.memmap(f, dtype=dtypes[name], mode="r", shape=shapes[name])
+
+# put the sample strings of a chunk of the variant data frame (df), whose
+# index is the row of each variant in the data file, into the side store,
+# and replace them with their hashes.
+# every chunk must come after the rows of the chunks before it in the data
+# file.
+# returns the compact chunk
+def compact_chunk(df):
+    columns = _store["columns"]
+    starts = np.zeros((len(df), len(columns)), dtype=np.int64)
+    lengths = np.zeros((len(df), len(columns)), dtype=np.int32)
+    df = df.copy()
+    for j, col in enumerate(columns):
+        values = df[col].values.astype(object)
+        missing = pd.isna(values)
+        encoded = pd.Series(values[~missing]).str.encode("utf-8")
+        sizes = encoded.str.len().values.astype(np.int64)
+
+        # the strings of the column, one after the other
+        present = np.flatnonzero(~missing)
+        starts[present, j] = _store["size"] + np.cumsum(sizes) - sizes
+        lengths[:, j] = -1
+        lengths[present, j] = sizes
+        _store["files"]["blob"].write(b"".join(encoded.tolist()))
+        _store["size"] += int(sizes.sum())
+
+        df[col] = pd.util.hash_array(values)
+
+    _store["files"]["starts"].write(starts.tobytes())
+    _store["files"]["lengths"].write(lengths.tobytes())
+    _store["labels"].append(np.asarray(df.index, dtype=np.int64))
+    _store["rows"] += len(df)
+    return df
+
+# get the decoded sample columns (decoded, as returned by decode_samples) in
+# compact storage
+def compact_decoded(decoded):
+    genotypes, depths, allele_ratios = decoded
+    return (genotypes.astype(np.int8),
+            depths.clip(0, np.iinfo(np.uint16).max).astype(np.uint16),
+            allele_ratios.astype(np.float32))
+
+# get the strings of the sample column (j) of the side store for the
+# positions (positions) of their rows in it.
+# returns an object array of the strings, NaN where they are missing
+def stored_strings(positions, j):
+    starts = _store["starts"][positions, j]
+    lengths = _store["lengths"][positions, j]
+    sizes = lengths.clip(0).astype(np.int64)
+    # the bytes of the strings one after the other, gathered from the blob at
+    # once
+    ends = np.cumsum(sizes)
+    offsets = np.repeat(starts - (ends - sizes), sizes)
+    data = _store["blob"][offsets + np.arange(len(offsets))].tobytes()
+    if data.isascii():
+        # the text can be cut at the positions of the bytes
+        data = data.decode("ascii")
+        strings = [data[end - size:end] for end, size in zip(ends.tolist(), sizes.tolist())]
+    else:
+        strings = [data[end - size:end].decode("utf-8")
+                   for end, size in zip(ends.tolist(), sizes.tolist())]
+    strings = np.array(strings, dtype=object)
+    strings[lengths < 0] = np.nan
+    return strings
+
+# get the dataframes of variants (frames), whose index is the row of each
+# variant in the data file, with the strings of their compacted sample
+# columns read back from the side store. the compacted columns of variants
+# that are not in the side store (e.g. in results cached by an earlier run,
+# see --result-cache) are dropped instead, so that join_columns reads them
+# back from the data file.
+# returns the list of dataframes, unchanged if nothing is in compact storage
+def expand_samples(frames):
+    compacted = [[col for col in format_columns(df.columns) if df[col].dtype == np.uint64]
+                 for df in frames]
+    # the strings of every variant in the frames are read once, as the same
+    # variant is often a candidate for several people and inheritance models
+    rows = [np.asarray(df.index, dtype=np.int64) for df in frames]
+    unique = np.unique(np.concatenate(rows + [np.array([], dtype=np.int64)]))
+    stored = False
+    if _store is not None and len(_store["labels"]) > 0:
+        positions = np.searchsorted(_store["labels"], unique).clip(0, len(_store["labels"]) - 1)
+        stored = bool((_store["labels"][positions] == unique).all())
+    strings = {}
+
+    expanded = []
+    for df, columns, index in zip(frames, compacted, rows):
+        if len(columns) == 0:
+            expanded.append(df)
+            continue
+        if len(df) == 0:
+            expanded.append(df.astype({col: object for col in columns}))
+            continue
+        if not stored or any(col not in _store["columns"] for col in columns):
+            expanded.append(df.drop(columns=columns))
+            continue
+        df = df.copy()
+        where = np.searchsorted(unique, index)
+        for col in columns:
+            if col not in strings:
+                strings[col] = stored_strings(positions, _store["columns"].index(col))
+            df[col] = pd.Series(strings[col][where], index=df.index, dtype=object)
+        expanded.append(df)
+    return expanded
@@ -1,15 +1,13 @@
 import pandas as pd
 import numpy as np
+from genotypes import *
 
 
 # filter the dataFrame (df) by the minimum allele depth (ad) in a particular
 # column (name)
 def filter_AD(df, name, ad):
-    strings=np.array(df[name])
-    ADindices=[s.split(":").index("AD") for s in df["FORMAT"]]
-    ADs=[strings[i].split(":")[ADindices[i]] for i in range(len(strings))]
-    ADs=[int(ad.split(",")[1])/max(int(ad.split(",")[0]),1) for ad in ADs]
-    df["AD"]=ADs
+    # alt/ref allele depth ratios, from the parsed sample columns if possible
+    df["AD"]=sample_allele_ratios(df, name)
     df=df[df["AD"]>ad]
     #print(len(df))
     return df
@@ -20,26 +18,24 @@ def filter_AD(df, name, ad):
 
 ## Old filter DP removed
 def filter_DP(df, name, dp, inplace=1):
-    strings = np.array(df[name])
-    DPindices = [s.split(":").index("DP") for s in df["FORMAT"]]
-    
-    DPs = []
-    for i in range(len(strings)):
-        fixed_str = strings[i].replace(":.", ":0")
-        value = fixed_str.split(":")[DPindices[i]]
-        DPs.append(int(value))
-
-    df["DP"] = DPs
+    keep = DP_mask(df, [name], dp)
 
     if inplace == 1:
-        df = df[df["DP"] >= dp].copy()
-        del df["DP"]
+        df = df[keep].copy()
         return df
     else:
-        dfcopy = df[df["DP"] >= dp].copy()
-        del dfcopy["DP"]
+        dfcopy = df[keep].copy()
         return dfcopy
 
+# get a boolean mask of the rows of the dataFrame (df) where the maximum read
+# depth of the people (names) is at least (dp)
+def DP_mask(df, names, dp):
+    def compute(df):
+        # read depths, from the parsed sample columns if possible
+        DPlist = [sample_depths(df, name) for name in names]
+        return np.max(DPlist, 0) >= dp
+    return frame_mask(df, ("DP", tuple(names), dp), compute)
+
 
 # filter the dataFrame (df) by the maximum number of occurences (cap) of a
 # particular zygosity (zyg), e.g. "0/1", in a range of columns
@@ -58,45 +54,168 @@ def filter_occurences(df, zyg, namestart, nameend, cap):
     #print(len(df))
     return df
 
-# filter the dataFrame (df) by the maximum population allele frequency (cap)
-def filter_AF(df, cap):
-    AF_columns=["AF","Kaviar_AF","REGENERON_ALL_AF","gnomad41_genome_AF_grpmax","gnomad41_exome_AF_grpmax"]
-    AF_columns = AF_columns + [col + ".1" for col in AF_columns]
+# the population allele frequency columns, including the duplicated ones
+# (pandas adds ".1" to the second column with the same name)
+AF_COLUMNS=["AF","Kaviar_AF","REGENERON_ALL_AF","gnomad41_genome_AF_grpmax","gnomad41_exome_AF_grpmax"]
+AF_COLUMNS = AF_COLUMNS + [col + ".1" for col in AF_COLUMNS]
+
+# convert a column of population allele frequencies (col) to floats, the way
+# filter_AF does: a "." (no frequency) becomes -1
+def AF_values(col):
+    return col.replace(".", "-1").astype(float)
 
-    for col in AF_columns:
+# convert the population allele frequency columns of the dataFrame (df) to
+# floats the way filter_AF does
+def convert_AF(df):
+    for col in AF_COLUMNS:
         if col in df.columns:
-            df.loc[df[col]==".",col]="-1"
-            df[col]=df[col].astype(float)
-            df=df[df[col]<=cap].copy()
+            df[col] = AF_values(df[col])
+    return df
+
+# get a boolean mask of the rows of the dataFrame (df) whose population allele
+# frequencies are all at most (cap)
+def AF_mask(df, cap):
+    def compute(df):
+        keep = np.ones(len(df), dtype=bool)
+        for col in AF_COLUMNS:
+            if col in df.columns:
+                keep &= (AF_values(df[col]) <= cap).values
+        return keep
+    return frame_mask(df, ("AF", None, cap), compute)
+
+# filter the dataFrame (df) by the maximum population allele frequency (cap),
+# converting the population allele frequencies to floats
+def filter_AF(df, cap):
+    df = convert_AF(df[AF_mask(df, cap)].copy())
     #print(len(df))
     return df
 
+# get a boolean mask of the rows of the dataFrame (df) whose sample column
+# (name) contains the zygosity (zyg), e.g. "0/1". uses the parsed genotype
+# codes if they are available, and scans the strings otherwise
+def has_zyg(df, name, zyg):
+    def compute(df):
+        codes = genotype_codes(df, name)
+        if codes is not None and zyg in ZYG_CODES:
+            return codes == ZYG_CODES[zyg]
+        return df[name].str.contains(zyg, na=False)
+    return frame_mask(df, ("zyg", name, zyg), compute)
+
+# get a boolean mask of the rows of the dataFrame (df) whose sample column
+# (name) starts with the zygosity (zyg), e.g. "1:"
+def has_1x_zyg(df, name, zyg):
+    def compute(df):
+        codes = genotype_codes(df, name)
+        if codes is not None and zyg in HEMI_CODES:
+            return codes == HEMI_CODES[zyg]
+        return df[name].str.startswith(zyg, na=False)
+    return frame_mask(df, ("1x_zyg", name, zyg), compute)
+
+# get a boolean mask of the rows of the dataFrame (df) that filter_zyg keeps
+# for the zygosity (zyg) in a particular column (name), or that exclude_zyg
+# keeps if exclude is True. all rows are kept if df has no such column
+def zyg_mask(df, name, zyg, exclude = False):
+    if name not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    keep = has_zyg(df, name, zyg)
+    return ~keep if exclude else keep
+
+# get a boolean mask of the rows of the dataFrame (df) that filter_1x_zyg
+# keeps for the zygosity (zyg) in a particular column (name), or that
+# exclude_1x_zyg keeps if exclude is True. all rows are kept if df has no such
+# column
+def zyg_1x_mask(df, name, zyg, exclude = False):
+    if name not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    keep = has_1x_zyg(df, name, zyg)
+    return ~keep if exclude else keep
+
+# get the rows of the dataFrame (df) selected by a boolean mask (keep) that
+# combines the masks of filter_AF (if af is True) and of the zygosity filters
+# of the people (names), or by an array of their positions in the order to
+# return them, the same way chaining those filters returns them:
+# with the population allele frequencies converted to floats, and without
+# duplicated rows if any of the people has a column in df
+def select_rows(df, keep, names, af = True):
+    dedup = any(name in df.columns for name in names)
+    # the hashes of the rows are taken before selecting them, so that those
+    # of the parsed data frame are computed once and shared
+    hashes = row_hashes(df)[keep] if dedup else None
+
+    df = df.iloc[keep].copy()
+    if af:
+        df = convert_AF(df)
+    if dedup:
+        df = drop_duplicated_rows(df, hashes)
+    return df
+
+# get a hash of every row of the dataFrame (df), as an array of uint64.
+# rows with the same values get the same hash, also after their population
+# allele frequencies are converted by filter_AF (they are hashed as floats)
+def row_hashes(df):
+    def compute(df):
+        hashes = np.zeros(len(df), dtype=np.uint64)
+        for i in range(len(df.columns)):
+            col = df.iloc[:, i]
+            if df.columns[i] in AF_COLUMNS:
+                col = pd.to_numeric(col.replace(".", "-1"), errors="coerce")
+            colhashes = pd.util.hash_pandas_object(col, index=False).values
+            hashes = hashes * np.uint64(1000003) ^ colhashes
+        return hashes
+    # frames with other columns (e.g. an added "Gene" column) get other hashes
+    return frame_array(df, ("hash", tuple(df.columns), None), compute, np.uint64)
+
+# remove duplicated rows from the dataFrame (df), keeping the first of them,
+# the same as df.drop_duplicates().
+# the rows are told apart by their hashes (hashes, or those of row_hashes),
+# and only rows with the same hash are compared in full
+def drop_duplicated_rows(df, hashes = None):
+    if hashes is None:
+        hashes = row_hashes(df)
+    same = pd.Series(hashes).duplicated(keep=False).values
+    if not same.any():
+        return df
+    duplicated = np.zeros(len(df), dtype=bool)
+    duplicated[same] = df[same].duplicated().values
+    return df[~duplicated]
+
+# get the boolean mask (keep) of the rows of the dataFrame (df) without the
+# rows that are the same as an earlier row in it, if any of the people
+# (names) has a column in df: the rows that select_rows returns, without
+# selecting them
+def unique_mask(df, keep, names):
+    if not any(name in df.columns for name in names):
+        return keep
+    positions = np.flatnonzero(keep)
+    same = positions[pd.Series(row_hashes(df)[positions]).duplicated(keep=False).values]
+    if len(same) == 0:
+        return keep
+    keep = keep.copy()
+    keep[same] = ~df.iloc[same].duplicated().values
+    return keep
+
 # filter the dataFrame (df) for the zygosity (zyg), e.g. "0/1", in a particular
 # column (name)
 def filter_zyg(df, name, zyg):
     if name in df.columns:
-        df=df[df[name].str.contains(zyg)]
-        df=df.drop_duplicates()
+        df = select_rows(df, zyg_mask(df, name, zyg), [name], af = False)
     return df
 
 def filter_1x_zyg(df, name, zyg):
     if name in df.columns:
-        df=df[df[name].str.startswith(zyg)]
-        df=df.drop_duplicates()
+        df = select_rows(df, zyg_1x_mask(df, name, zyg), [name], af = False)
     return df
 
 # filter the dataFrame (df) to exclude a certain zygosity (zyg) in a particular
 # column (name)
 def exclude_zyg(df, name, zyg):
     if name in df.columns:
-        df = df[~df[name].str.contains(zyg)]
-        df=df.drop_duplicates()
+        df = select_rows(df, zyg_mask(df, name, zyg, exclude = True), [name], af = False)
     return df
 
 def exclude_1x_zyg(df, name, zyg):
     if name in df.columns:
-        df = df[~df[name].str.startswith(zyg)]
-        df=df.drop_duplicates()
+        df = select_rows(df, zyg_1x_mask(df, name, zyg, exclude = True), [name], af = False)
     return df
 # filter out variants that are "Benign" or "Likely benign"
 def filter_benign(df):
@@ -110,27 +229,13 @@ def filter_benign(df):
 # Filter DP Max Changed:
 
 def filter_DP_Max(df, names, dp, inplace=1):
-    DPlist = []
-    for name in names:
-        strings = np.array(df[name])
-        DPindices = [s.split(":").index("DP") for s in df["FORMAT"]]
-        dp_values = []
-        for i in range(len(strings)):
-            # Replace any occurrence of ":." with ":0" before splitting
-            fixed_str = strings[i].replace(":.", ":0")
-            val = fixed_str.split(":")[DPindices[i]]
-            dp_values.append(int(val))
-        DPlist.append(dp_values)
-    DPs = np.max(DPlist, 0)
-    df["DP"] = DPs
+    keep = DP_mask(df, names, dp)
 
     if inplace == 1:
-        df = df[df["DP"] >= dp].copy()
-        del df["DP"]
+        df = df[keep].copy()
         return df
     else:
-        dfcopy = df[df["DP"] >= dp].copy()
-        del dfcopy["DP"]
+        dfcopy = df[keep].copy()
         return dfcopy
 
 
@@ -139,11 +244,24 @@ def filter_DP_Max(df, names, dp, inplace=1):
 def filter_chr(df, chrom, exclude = False):
     if "Chr" in df.columns:
         if exclude:
-            df=df[~df["Chr"].str.contains(chrom)]
+            df=df[~chr_mask(df, chrom)]
         else:
-            df=df[df["Chr"].str.contains(chrom)]
+            df=df[chr_mask(df, chrom)]
     return df
 
+# get the positions of the rows of the dataFrame (df) that filter_chr keeps
+# for a particular chromosome (chrom), e.g. to select them with select_rows
+def chr_rows(df, chrom):
+    if "Chr" in df.columns:
+        return np.flatnonzero(chr_mask(df, chrom))
+    return np.arange(len(df))
+
+# get a boolean mask of the rows of the dataFrame (df) on a particular
+# chromosome (chrom)
+def chr_mask(df, chrom):
+    return frame_mask(df, ("chr", None, chrom),
+                      lambda df: df["Chr"].str.contains(chrom, na=False))
+
 # get which gene in a string of genes (genestring) separated by ;
 # is in a list of genes (famgenes), or -1 if none are
 def gene_in_list(genestring, famgenes):
@@ -153,28 +271,75 @@ def gene_in_list(genestring, famgenes):
             return i
     return -1
 
+# the genes of every distinct Gene.refGene string indexed so far (see
+# index_genes), shared by the phenotype filter of every family:
+# the distinct strings
+_gene_strings = None
+# one row per gene in each string, with the position of the string in
+# _gene_strings, the position of the gene in the string, and the gene, in
+# the order of the strings and of the genes in each string
+_gene_tokens = None
+
+# empty the gene index, e.g. before indexing the genes of another data file
+def clear_gene_index():
+    global _gene_strings, _gene_tokens
+    _gene_strings = pd.Index([], dtype=object)
+    _gene_tokens = pd.DataFrame({"string": np.array([], dtype=np.int64),
+                                 "position": np.array([], dtype=np.int64),
+                                 "gene": np.array([], dtype=object)})
+
+clear_gene_index()
+
+# add the strings of a column of Gene.refGene strings (genestrings) to the
+# gene index, splitting each distinct string that is new into its genes once.
+# returns an array of the position of each string in the index
+def index_genes(genestrings):
+    global _gene_strings, _gene_tokens
+
+    # (astype changes the column itself in pandas 1.5 for data frames read
+    # from a pickle, e.g. the cache, so it is given a copy)
+    genestrings = genestrings.copy().astype(str)
+    positions = _gene_strings.get_indexer(genestrings)
+    if (positions != -1).all():
+        return positions
+
+    new = pd.Index(pd.unique(genestrings[positions == -1]))
+    genes = pd.Series(new).str.split(";").explode()
+    tokens = pd.DataFrame({"string": genes.index.values + len(_gene_strings),
+                           "position": genes.groupby(level=0).cumcount().values,
+                           "gene": genes.values})
+    _gene_strings = _gene_strings.append(new)
+    _gene_tokens = pd.concat([_gene_tokens, tokens], ignore_index=True)
+    return _gene_strings.get_indexer(genestrings)
+
 # filter the dataframe for only variants in genes associated with the Family
 # object's (fam)'s phenotype
 def filter_phen(df, fam):
-    if len(fam.genes) == 0:
+    # (no model may have returned any columns, e.g. if only some were run)
+    if len(fam.genes) == 0 or "Gene.refGene" not in df.columns:
         return pd.DataFrame()
 
-    # get which gene in every gene string is in fam.genes
-    gene_locs = [gene_in_list(gene,fam.genes) for gene in df["Gene.refGene"].astype(str)]
+    positions = index_genes(df["Gene.refGene"])
+
+    # get the first gene of every indexed string that is in fam.genes (the
+    # tokens are in the order of the genes in each string), or None
+    matches = _gene_tokens[_gene_tokens["gene"].isin(fam.genes)]
+    matches = matches.drop_duplicates(subset="string")
+    first = np.full(len(_gene_strings), None, dtype=object)
+    first[matches["string"].values] = matches["gene"].values
+
     # get a list of booleans:
     # True if a gene in a gene string is in fam.genes, False otherwise
-    subset = [num != -1 for num in gene_locs]
+    genes = first[positions]
+    subset = pd.notna(genes)
 
     # filter the dataframe by the subset
     df = df[subset]
 
-    # shrink the gene_locs list to only include filtered values
-    gene_locs =  [loc for (loc, include) in zip(gene_locs, subset) if include]
-
     # use the Family's genes-to-n-associated-phenotypes dict to get a list of
     # counts of associated phenotypes for each of the rows.
-    # the gene identified by gene_locs is the one passed into the dict.
-    counts = [fam.genes[gene.split(";")[loc]] for gene,loc in zip(df["Gene.refGene"],gene_locs)]
+    # the first matching gene of each row is the one passed into the dict.
+    counts = [fam.genes[gene] for gene in genes[subset]]
 
     # insert a column containing these counts
     df.insert(3, "phens_matched", counts)
@@ -0,0 +1,224 @@
+# This file is for decoding the sample columns of the variant data frame
+# (e.g. "0/1:10,8:18:99:200,0,300") into small integer genotype codes and
+# numeric read depths.
+# The sample columns are decoded once after the data is loaded, and the
+# filters then compare numbers instead of scanning and splitting the strings
+# again for every model and subfamily.
+
+import numpy as np
+import pandas as pd
+
+# genotype codes
+MISSING = -1   # anything else, e.g. ./.
+HOM_REF = 0    # 0/0
+HET = 1        # 0/1
+HOM_ALT = 2    # 1/1
+HEMI_REF = 3   # 0: (hemizygous reference)
+HEMI_ALT = 4   # 1: (hemizygous alternate)
+
+# the zygosities the filters look for inside a sample string, and their codes
+ZYG_CODES = {"0/0": HOM_REF, "0/1": HET, "1/1": HOM_ALT}
+# the zygosities the filters look for at the start of a sample string
+# (hemizygous calls on chrX), and their codes
+HEMI_CODES = {"0:": HEMI_REF, "1:": HEMI_ALT}
+
+# the decoded sample columns of the variant data frame that was last parsed.
+# each is a data frame with one column per sample and the same index as the
+# variant data frame:
+# genotype codes (int8)
+_genotypes = None
+# read depths, the DP field (int32)
+_depths = None
+# allele depth ratios, alt/ref from the AD field (float64)
+_allele_ratios = None
+
+# arrays over the rows of the variant data frame that was last parsed, such
+# as the boolean masks of frame_mask, keyed on what they hold, e.g. ("zyg",
+# sample, "0/1") for the mask of the rows where the sample is 0/1
+_arrays = {}
+
+# get the genotype code for the start of a sample string (prefix), matching
+# it the same way the string filters do
+def genotype_code(prefix):
+    for zyg, code in ZYG_CODES.items():
+        if zyg in prefix:
+            return code
+    for zyg, code in HEMI_CODES.items():
+        if prefix.startswith(zyg):
+            return code
+    return MISSING
+
+# decode an array of sample strings (strings) into an int8 array of
+# genotype codes
+def decode_genotypes(strings):
+    # the genotype is at the start of the string, and the first four
+    # characters are enough to tell the calls apart (e.g. "0/1:" or "1:12").
+    # there are only a handful of distinct prefixes, so each one is decoded
+    # once and the codes are looked up from them
+    prefixes = pd.Series(strings).str.slice(0, 4)
+    codes, uniques = pd.factorize(prefixes)
+    # missing strings get -1 from factorize, which picks the MISSING code
+    # at the end of the lookup table
+    table = np.array([genotype_code(p) for p in uniques] + [MISSING], dtype=np.int8)
+    return table[codes]
+
+# group the rows of the variant data frame by their FORMAT string (formats),
+# getting a list with one (row positions, {field: index}) pair per distinct
+# FORMAT, e.g. {"GT": 0, "AD": 1, "DP": 2, ...} for "GT:AD:DP:GQ:PL"
+def format_layouts(formats):
+    codes, uniques = pd.factorize(formats)
+    layouts = []
+    for i, layout in enumerate(uniques):
+        fields = {}
+        for index, field in enumerate(layout.split(":")):
+            # like list.index, use the first occurrence of a field
+            fields.setdefault(field, index)
+        layouts.append((np.flatnonzero(codes == i), fields))
+    return layouts
+
+# extract the fields (fields), e.g. ["DP", "AD"], from an array of sample
+# strings (strings) whose FORMAT layouts are (layouts).
+# returns one object array of field strings per field, with NaN where a row
+# has no such field
+def extract_fields(strings, layouts, fields):
+    values = [np.full(len(strings), np.nan, dtype=object) for field in fields]
+    for positions, layout in layouts:
+        indices = [layout.get(field) for field in fields]
+        present = [index for index in indices if index is not None]
+        if len(present) == 0:
+            continue
+        # split every string in the group once, only as far as needed
+        split = pd.Series(strings[positions]).str.split(":", n=max(present) + 1)
+        for value, index in zip(values, indices):
+            if index is not None:
+                value[positions] = split.str[index].values
+    return values
+
+# convert an array of DP field strings (fields) into an int32 array of
+# read depths.
+# like the original filters, a "." is read as 0; so are missing fields
+def read_depths(fields):
+    fields = pd.Series(fields, dtype=object).str.replace(r"^\.", "0", regex=True)
+    depths = pd.to_numeric(fields, errors="coerce")
+    return depths.fillna(0).values.astype(np.int32)
+
+# convert an array of AD field strings (fields), e.g. "10,8", into a float64
+# array of alt/ref allele depth ratios (with a minimum ref depth of 1).
+# fields that cannot be read give NaN
+def read_allele_ratios(fields):
+    split = pd.Series(fields, dtype=object).str.split(",", n=2)
+    ref = pd.to_numeric(split.str[0], errors="coerce")
+    alt = pd.to_numeric(split.str[1], errors="coerce")
+    return (alt / np.maximum(ref, 1)).values.astype(np.float64)
+
+# decode the sample columns (names) of the variant data frame (df) into
+# genotype codes, read depths and allele depth ratios.
+# returns a tuple of three data frames with one column per sample.
+# names that are not columns of df are ignored.
+def decode_samples(df, names):
+
+    # the decoded columns are matched to rows by their index, so it must be
+    # unique
+    if not df.index.is_unique:
+        raise ValueError("The variant data frame must have a unique index to parse genotypes.")
+
+    names = [name for name in dict.fromkeys(names) if name in df.columns]
+    layouts = format_layouts(df["FORMAT"].values)
+
+    genotypes, depths, allele_ratios = {}, {}, {}
+    for name in names:
+        strings = df[name].values
+        genotypes[name] = decode_genotypes(strings)
+        dp, ad = extract_fields(strings, layouts, ["DP", "AD"])
+        depths[name] = read_depths(dp)
+        allele_ratios[name] = read_allele_ratios(ad)
+
+    return (pd.DataFrame(genotypes, index=df.index),
+            pd.DataFrame(depths, index=df.index),
+            pd.DataFrame(allele_ratios, index=df.index))
+
+# decode the sample columns (names) of the variant data frame (df), and keep
+# them for the filters
+def parse_genotypes(df, names):
+    restore_genotypes(decode_samples(df, names))
+    return _genotypes
+
+# get the values of the sample (name) in a decoded data frame (decoded) for
+# the rows of a data frame (df), as an array.
+# returns None if the sample was not parsed or df has rows that were not
+# part of the parsed data frame.
+def lookup(decoded, df, name):
+    if decoded is None or name not in decoded.columns:
+        return None
+
+    values = decoded[name]
+    if df.index.equals(values.index):
+        return values.values
+
+    # df is a subset of the parsed data frame, so look its rows up by index
+    positions = values.index.get_indexer(df.index)
+    if (positions == -1).any():
+        return None
+    return values.values[positions]
+
+# get the genotype codes of the sample (name) for the rows of a data frame
+# (df), or None if they were not parsed
+def genotype_codes(df, name):
+    return lookup(_genotypes, df, name)
+
+# get the read depths of the sample (name) for the rows of a data frame (df).
+# if they were not parsed, they are read from the strings of df
+def sample_depths(df, name):
+    depths = lookup(_depths, df, name)
+    if depths is None:
+        dp, = extract_fields(df[name].values, format_layouts(df["FORMAT"].values), ["DP"])
+        depths = read_depths(dp)
+    return depths
+
+# get the allele depth ratios of the sample (name) for the rows of a data
+# frame (df). if they were not parsed, they are read from the strings of df
+def sample_allele_ratios(df, name):
+    ratios = lookup(_allele_ratios, df, name)
+    if ratios is None:
+        ad, = extract_fields(df[name].values, format_layouts(df["FORMAT"].values), ["AD"])
+        ratios = read_allele_ratios(ad)
+    return ratios
+
+# get an array of the values (e.g. True/False) of the rows of a data frame
+# (df), of the dtype (dtype), with the function (compute), which is given df.
+# if df has the same rows as the last parsed data frame, the array is kept
+# under the key (key) and only computed the first time, so that every model
+# and subfamily that asks for it shares it. if df is part of the parsed data
+# frame, its values are taken from the kept array
+def frame_array(df, key, compute, dtype):
+    if _genotypes is None:
+        return np.asarray(compute(df), dtype=dtype)
+
+    if df.index.equals(_genotypes.index):
+        if key not in _arrays:
+            _arrays[key] = np.asarray(compute(df), dtype=dtype)
+        return _arrays[key]
+
+    if key in _arrays:
+        positions = _genotypes.index.get_indexer(df.index)
+        if not (positions == -1).any():
+            return _arrays[key][positions]
+    return np.asarray(compute(df), dtype=dtype)
+
+# get a boolean mask of the rows of a data frame (df) with the function
+# (compute), kept under the key (key), e.g. ("zyg", sample, "0/1") (see
+# frame_array)
+def frame_mask(df, key, compute):
+    return frame_array(df, key, compute, bool)
+
+# get the decoded sample columns of the last parsed data frame, e.g. to hand
+# them to another process
+def parsed_genotypes():
+    return _genotypes, _depths, _allele_ratios
+
+# restore the decoded sample columns (parsed) returned by parsed_genotypes.
+# the arrays kept for the previous data frame are dropped
+def restore_genotypes(parsed):
+    global _genotypes, _depths, _allele_ratios, _arrays
+    _genotypes, _depths, _allele_ratios = parsed
+    _arrays = {}
@@ -0,0 +1,205 @@
+# This file is for reading the variant data file with only the columns that a
+# run needs.
+# ANNOVAR output has hundreds of annotation columns, but the filters and
+# models only read a few of them and the sample columns of the pedigree. The
+# other columns are only needed for the output, so they are read back for the
+# candidate variants when the output is written.
+#
+# The data file may also be an annotated VCF file (see vcf.py), whose columns
+# are those of the variant data frame made from it.
+
+import numpy as np
+import pandas as pd
+from filters import *
+from vcf import *
+from compact import *
+
+# the annotation columns that the filters and models read, besides the
+# population allele frequency columns (AF_COLUMNS in filters.py)
+ANNOTATION_COLUMNS = ["Chr", "Start", "End", "FORMAT", "Gene.refGene", "CLNSIG"]
+
+# get the names of the columns of the data file (path), the way pandas names
+# them (the second of two columns with the same name gets ".1" added)
+def read_header(path):
+    if is_vcf(path):
+        return vcf_columns(path)
+    return list(pd.read_csv(path, sep='\t', nrows=0).columns)
+
+# get the columns in the header of the data file (header) that are needed to
+# filter variants for the samples (samples), in the order of the header
+def needed_columns(header, samples):
+    needed = set(ANNOTATION_COLUMNS) | set(AF_COLUMNS) | set(samples)
+    return [col for col in header if col in needed]
+
+# read the variant data file (path), loading only the columns needed to
+# filter variants for the samples (samples).
+# Chr and FORMAT are read as categoricals and the sample columns as text.
+# the other columns, including the population allele frequencies, get the
+# same values as when every column is read (see read_data), so the output is
+# the same as without pruning; the filters convert the frequencies as they
+# need them (see AF_mask).
+# if chunksize is given, the file is read (chunksize) rows at a time, getting
+# an iterator of dataframes, and the dtypes of the whole file are added to the
+# dict (found) if it is given (see read_chunks)
+def read_variants(path, samples, chunksize = None, found = None):
+    header = read_header(path)
+    columns = needed_columns(header, samples)
+
+    dtypes = {"Chr": "category", "FORMAT": "category"}
+    dtypes = {col: dtype for col, dtype in dtypes.items() if col in columns}
+
+    if is_vcf(path):
+        if chunksize is not None:
+            return (chunk.astype(dtypes) for chunk in read_vcf(path, columns, chunksize))
+        return read_vcf(path, columns).astype(dtypes)
+
+    # (the sample columns of a VCF file are always read as text)
+    dtypes.update({col: str for col in samples if col in columns})
+    if chunksize is not None:
+        return read_chunks(path, columns, chunksize, dtypes, found)
+
+    # columns are selected by position, since duplicated column names only
+    # get their ".1" once they have been read
+    df = pd.read_csv(path, sep='\t', low_memory=False,
+                     usecols=[header.index(col) for col in columns], dtype=dtypes)
+    return df
+
+# read every column of the variant data file (path), which may be a VCF file
+def read_data(path):
+    if is_vcf(path):
+        return read_vcf(path)
+    return pd.read_csv(path, sep='\t', low_memory=False)
+
+# read the columns (columns) of the variant data file (path), (chunksize) rows
+# at a time, getting an iterator of dataframes whose index is the row of each
+# variant in the file.
+# the columns that are not in the dict dtypes are read as text, exactly as
+# they appear in the file: pandas would give each chunk the dtypes of its own
+# rows, and finding those of the whole file first would take an extra pass
+# over it. instead, if (found) is a dict, the dtypes these columns get when
+# the whole file is read at once are added to it as the chunks are read (see
+# add_number_dtypes), so that the variants kept from the chunks can be given
+# them once every chunk is read (see convert_numbers)
+def read_chunks(path, columns, chunksize, dtypes = None, found = None):
+    if is_vcf(path):
+        # every column of a VCF file but Start and End is read as text, also
+        # when the whole file is read
+        chunks = read_vcf(path, columns, chunksize)
+        return (chunk.astype(dtypes) for chunk in chunks) if dtypes else chunks
+    header = read_header(path)
+    chunks = pd.read_csv(path, sep='\t', usecols=[header.index(col) for col in columns],
+                         dtype=str, chunksize=chunksize)
+    return typed_chunks(chunks, dtypes or {}, found)
+
+# get an iterator of chunks of variants read as text (chunks) with the
+# columns in the dict (dtypes) given their dtypes, adding the dtypes of the
+# whole file of the other columns to the dict (found) if it is given
+def typed_chunks(chunks, dtypes, found):
+    for chunk in chunks:
+        if found is not None:
+            add_number_dtypes(chunk, [col for col in chunk.columns if col not in dtypes], found)
+        yield chunk.astype({col: dtype for col, dtype in dtypes.items() if dtype is not str})
+
+# add the columns of the data file (path) that were not loaded to a list of
+# dataframes of variants (frames), whose index is the row of each variant in
+# the data file. the columns are put back in the order of the data file,
+# after any columns that are not in it that come before them (e.g. "inh
+# model") and before those that come after them (e.g. the repeated INFO
+# fields of a VCF file, such as AF.1).
+# the added columns get the same values as when every column is read (see
+# read_rows).
+# the strings of sample columns in compact storage (see compact.py) are read
+# back first.
+# returns a list of the joined dataframes
+def join_columns(frames, path):
+    frames = expand_samples(frames)
+    header = read_header(path)
+
+    # empty dataframes without columns (e.g. from a family without
+    # phenotypes) are left as they are
+    nonempty = [df for df in frames if len(df.columns) > 0]
+
+    # only the rows of the data file that are in one of the frames are kept
+    rows = set()
+    for df in nonempty:
+        rows.update(df.index)
+    missing = [col for col in header if not all(col in df.columns for df in nonempty)]
+    if len(rows) == 0 or len(missing) == 0:
+        return frames
+
+    other = read_rows(path, header, missing, rows)
+
+    joined = []
+    for df in frames:
+        if len(df.columns) == 0:
+            joined.append(df)
+            continue
+        extra = other.loc[df.index, [col for col in missing if col not in df.columns]]
+        extra.index = df.index
+        df = pd.concat([df, extra], axis=1)
+        inside = [col in header for col in df.columns]
+        first = inside.index(True) if True in inside else len(inside)
+        leading = [col for col in df.columns[:first] if col not in header]
+        trailing = [col for col in df.columns[first:] if col not in header]
+        joined.append(df[leading + header + trailing])
+    return joined
+
+# the number of rows of the data file read_rows reads at a time
+ROWS_CHUNKSIZE = 100000
+
+# read the columns (columns) of the rows (rows, a set of positions) of the
+# data file (path) with the columns (header).
+# the columns of a tab-separated file that hold only numbers (or missing
+# values) in every row of the file get the dtype they get when the whole
+# file is read at once (see read_data), and the others are read as text,
+# exactly as they appear in the file.
+# returns a dataframe whose index is the row of each variant in the data file
+def read_rows(path, header, columns, rows):
+    if is_vcf(path):
+        chunks = read_vcf(path, columns, chunksize=100000)
+        return pd.concat([chunk.loc[chunk.index.isin(rows), columns].astype(str)
+                          for chunk in chunks])
+
+    # every row is read, to find the columns that hold only numbers, and the
+    # kept rows are in the order of the data file
+    found = {}
+    kept = []
+    for chunk in pd.read_csv(path, sep='\t', dtype=str, chunksize=ROWS_CHUNKSIZE,
+                             usecols=[header.index(col) for col in columns]):
+        add_number_dtypes(chunk, chunk.columns, found)
+        kept.append(chunk[chunk.index.isin(rows)])
+    return convert_numbers(pd.concat(kept), found)
+
+# add to the dict (found) the dtype that each of the columns (columns) of a
+# part of a data file read as text (df) gets when pandas reads it along with
+# the parts already added: the dtype of its numbers if every value of the
+# column is a number or missing, and object otherwise
+def add_number_dtypes(df, columns, found):
+    for col in columns:
+        if found.get(col) == object:
+            continue
+        dtype = number_dtype(df[col])
+        if dtype is None:
+            found[col] = np.dtype(object)
+        elif col in found:
+            found[col] = np.result_type(found[col], dtype)
+        else:
+            found[col] = dtype
+
+# get a dataframe of variants whose columns were read as text (df) with the
+# columns that hold only numbers in the dict (found, see add_number_dtypes)
+# converted to their dtypes, as when the whole data file is read at once
+def convert_numbers(df, found):
+    converted = {col: pd.to_numeric(df[col]).astype(dtype) for col, dtype in found.items()
+                 if dtype != object and col in df.columns}
+    if len(converted) == 0:
+        return df
+    return df.assign(**converted)
+
+# get the dtype pandas gives a column of text (col) when it reads it as
+# numbers, or None if not every value of it is a number or missing
+def number_dtype(col):
+    try:
+        return pd.to_numeric(col).dtype
+    except (ValueError, TypeError):
+        return None
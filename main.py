@@ -2,6 +2,11 @@ import argparse
 import pandas as pd
 from family import *
 from utils import *
+from cache import *
+from loading import *
+from streaming import *
+from shards import *
+from output import *
 
 if __name__ == '__main__':
     argp = argparse.ArgumentParser()
@@ -13,62 +18,247 @@ if __name__ == '__main__':
     argp.add_argument('-ph', '--phenfile', default="Test_Phen.txt")
     argp.add_argument('-m', '--mapfile', default="phenotype_to_genes.txt")
     argp.add_argument('--nophen', default = False, action = 'store_true')
+    argp.add_argument('-j', '--jobs', default = 1, type = int)
+    argp.add_argument('--cache', default = False, action = 'store_true')
+    argp.add_argument('--prune-columns', default = False, action = 'store_true')
+    argp.add_argument('--compact', default = False, action = 'store_true')
+    argp.add_argument('--chunksize', default = None, type = int)
+    argp.add_argument('--result-cache', default = None)
+    argp.add_argument('--regions', default = None)
+    argp.add_argument('--shard', default = None)
+    argp.add_argument('--stream-output', default = False, action = 'store_true')
+    argp.add_argument('--quiet', default = False, action = 'store_true')
+    argp.add_argument('--profile-report', default = None)
+    argp.add_argument('--cprofile', default = None)
 
     args = argp.parse_args()
+    if args.chunksize is not None and args.cache:
+        argp.error("--cache cannot be used with --chunksize")
+    if args.chunksize is not None and args.compact:
+        argp.error("--compact cannot be used with --chunksize")
+    if args.stream_output and args.shard is not None:
+        argp.error("--stream-output cannot be used with --shard")
+    # check that the output files can be written before filtering anything
+    try:
+        check_output(args.output, args.stream_output)
+        if not args.nophen:
+            check_output(args.output_phen, args.stream_output)
+    except ValueError as e:
+        argp.error(str(e))
+
+    # record the time, memory and rows of every stage for the report
+    if args.profile_report is not None:
+        start_report()
 
     # get a dict of families from the pedfile
-    families = get_families(args.pedfile)
+    with profile_stage("get_families") as record:
+        families = get_families(args.pedfile)
+        record["families"] = len(families)
 
+    # with --shard i/N, filter only the i-th of N blocks of families, and
+    # write their results for merge.py instead of the output files
+    others = set()
+    if args.shard is not None:
+        try:
+            index, count = parse_shard(args.shard)
+        except ValueError as e:
+            argp.error(str(e))
+        shard = shard_families(families, index, count)
+        others = set(families) - set(shard)
+        print("Shard", index, "of", count, "filtering", len(shard), "of", len(families), "families")
+        families = shard
     
     if not args.nophen:
         print("Getting relevant genes for family phenotypes...")
         # give each family a list of genes relevant to their phenotype
-        load_phen(families, args.phenfile, args.mapfile)
+        with profile_stage("load_phen"):
+            load_phen(families, args.phenfile, args.mapfile, args.cache)
+
+    # the samples of everyone in the pedigree
+    samples = [person.ID for fam in families.values() for person in fam.people]
 
-    # read in the file containing variants
-    df = pd.read_csv(args.data, sep='\t', low_memory=False)
-    #check that there are no errors, and remove rows with errors.
-    df = verify(df)
+    # the columns of the file containing variants to load: all of them, or
+    # only those the filters need for these samples
+    columns = read_header(args.data)
+    if args.prune_columns:
+        columns = needed_columns(columns, samples)
 
-    # csv with variants in one family
-    if args.family != "":
+    # with --shard, the csv of the family is written by the shard filtering it
+    fam = None
+    if args.family != "" and args.family not in others:
         fam = families[args.family]
-        fam_variants = df.copy()
-        for person in fam.people:
-            filt = filter_zyg if person.phen == "Unaffected" else exclude_zyg
-            fam_variants = filt(fam_variants, person.ID, "0/0")
-        fam_variants.to_csv(fam.ID + ".csv")
 
+    # whether columns of the candidates are read back in from the data file
+    # when the output is written: those that were not loaded, and the sample
+    # strings of compact storage
+    join = args.prune_columns or args.compact
+
+    # the regions of the genome to filter the variants of, or None for all
+    regions = read_regions(args.regions) if args.regions is not None else None
+
+    # get the results of the families that are in the result cache of a
+    # previous run, and filter only the other families
+    cached = {}
+    if args.result_cache is not None:
+        with profile_stage("load_results") as record:
+            keys = result_keys(args.result_cache, args.data, families.values(),
+                               columns, args.prune_columns, not args.nophen, args.regions,
+                               args.compact)
+            cached = load_results(args.result_cache, keys)
+            record["families"] = len(cached)
+        print("Using the cached results of", len(cached), "of", len(families), "families")
+    tofilter = [family for family in families.values() if family.ID not in cached]
+
+    # with --stream-output, the results of each family are added to the
+    # output files as soon as it is filtered, instead of being kept
+    stream = None
+    write = None
+    if args.stream_output:
+        stream = OutputStream(args.output, None if args.nophen else args.output_phen,
+                              args.data if join else None)
+        # the cached results are added in the order of the pedfile, before
+        # the next family that was filtered
+        order = iter(families)
+        def write(family, famresult, famresult_p):
+            for ID in order:
+                if ID == family.ID:
+                    break
+                stream.add(*cached[ID])
+            if args.result_cache is not None:
+                save_results(args.result_cache, {family.ID: keys[family.ID]},
+                             {family.ID: (famresult, famresult_p)})
+            stream.add(famresult, famresult_p)
 
-    # empty dataframes for results with and without phenotype filter
-    result = pd.DataFrame()
-    result_p = pd.DataFrame()
+    # profile the filtering of the families with cProfile
+    if args.cprofile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
 
-    for fam in families.values():
+    if len(tofilter) == 0 and fam is None:
+        # every family is cached, so the variants are not needed
+        famresults, famresults_p = [], []
 
-        print("Filtering", fam.ID + '...')
+    elif args.chunksize is not None:
+        # read the file containing variants args.chunksize rows at a time,
+        # filtering each chunk for every family. the columns read as text get
+        # the dtypes of the whole file (found) once every chunk is read
+        found = {}
+        if args.prune_columns:
+            chunks = read_variants(args.data, samples, args.chunksize, found)
+        else:
+            chunks = read_chunks(args.data, columns, args.chunksize, found = found)
+        if regions is not None:
+            chunks = (select_regions(chunk, regions) for chunk in chunks)
+        with profile_stage("filter_chunks") as record:
+            famresults, famresults_p, fam_variants = filter_chunks(
+                chunks, tofilter, not args.nophen, samples, args.jobs, fam, write, found)
 
-        # get a dataframe of variants for the family,
-        # without phenotype filter
-        famresult = filter_family(df, fam, phenfilter = False)
-        # append it to the results
-        result = pd.concat([result,famresult])
+    else:
+        # load the variants, from the cache of a previous run on the same file
+        # or by reading and checking the file, and parse their genotypes
+        df = load_variants(args.data, samples, columns, args.cache, args.prune_columns, regions,
+                           args.compact)
 
+        # split the genes of the variants once, for the phenotype filter of
+        # every family
         if not args.nophen:
-            # get a dataframe of variants for the family,
-            # with phenotype filter
-            famresult_p = filter_family(df, fam, phenfilter = True)
-            # append it to the results
-            result_p = pd.concat([result_p,famresult_p])
-
-    # organize result first by sample and then by inh model
-    result = result.sort_values(['sample', 'inh model'])
-    #save result
-    result.to_csv(args.output)
-    print(result)
-
-    #save result with phenotype filter
-    if not args.nophen:
-        result_p = result_p.sort_values(['family','phens_matched','sample'])
-        result_p.to_csv(args.output_phen)
-        print(result_p)
+            with profile_stage("index_genes", rows_in = len(df)):
+                index_genes(df["Gene.refGene"])
+
+        if fam is not None:
+            with profile_stage("family_variants", rows_in = len(df)) as record:
+                fam_variants = family_variants(df, fam)
+                record["rows_out"] = len(fam_variants)
+
+        # get a list of dataframes of variants for each family, without and
+        # with phenotype filter, filtering up to args.jobs families at once
+        with profile_stage("filter_families", rows_in = len(df), jobs = args.jobs):
+            famresults, famresults_p = filter_families(df, tofilter, not args.nophen, args.jobs, write)
+
+    if args.cprofile is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+
+    if stream is not None:
+        # the cached results after the last family that was filtered
+        for ID in order:
+            stream.add(*cached[ID])
+
+    elif args.result_cache is not None:
+        # cache the results of the families that were filtered, and put them
+        # together with the cached ones in the order of the pedfile
+        results = dict(zip([family.ID for family in tofilter],
+                           zip(famresults, famresults_p or [None] * len(famresults))))
+        with profile_stage("save_results") as record:
+            save_results(args.result_cache, keys, results)
+            record["families"] = len(results)
+        results.update(cached)
+        famresults = [results[ID][0] for ID in families]
+        famresults_p = [results[ID][1] for ID in families if not args.nophen]
+
+    with profile_stage("write_output") as record:
+        # csv with variants in one family
+        if fam is not None:
+            if join:
+                fam_variants, = join_columns([fam_variants], args.data)
+            fam_variants.to_csv(fam.ID + ".csv")
+
+        if args.shard is not None:
+            # the partial output of the shard, with the columns that were not
+            # loaded read back in already, so merge.py does not need the data
+            if join:
+                joined = join_columns(famresults + famresults_p, args.data)
+                famresults, famresults_p = joined[:len(famresults)], joined[len(famresults):]
+            write_shard(args.output, index, count, families, famresults,
+                        None if args.nophen else famresults_p)
+            record["families"] = len(families)
+
+        elif stream is not None:
+            # sort the candidates of the families into the output files
+            rows = stream.close()
+            record["rows_out"] = rows[0]
+            if not args.nophen:
+                record["rows_out_phen"] = rows[1]
+
+        else:
+            result = pd.concat(famresults)
+            if not args.nophen:
+                result_p = pd.concat(famresults_p)
+
+            # organize result first by sample and then by inh model
+            result = result.sort_values(SORT_COLUMNS)
+            if not args.nophen:
+                result_p = result_p.sort_values(SORT_COLUMNS_PHEN)
+
+            # read the columns that were not loaded back in, for the candidates only
+            if join:
+                if args.nophen:
+                    result, = join_columns([result], args.data)
+                else:
+                    result, result_p = join_columns([result, result_p], args.data)
+
+            #save result
+            write_frame(result, args.output)
+            record["rows_out"] = len(result)
+
+            #save result with phenotype filter
+            if not args.nophen:
+                write_frame(result_p, args.output_phen)
+                record["rows_out_phen"] = len(result_p)
+
+    if args.shard is not None:
+        print("Wrote the results of shard", index, "of", count, "to",
+              shard_path(args.output, index, count))
+    elif stream is not None or args.quiet:
+        print("Wrote", record["rows_out"], "candidates to", args.output)
+        if not args.nophen:
+            print("Wrote", record["rows_out_phen"], "candidates with the phenotype filter to",
+                  args.output_phen)
+    else:
+        print(result)
+        if not args.nophen:
+            print(result_p)
+
+    if args.profile_report is not None:
+        write_report(args.profile_report)
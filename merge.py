@@ -0,0 +1,54 @@
+# This file is for merging the partial outputs of the shards of a sharded
+# run (main.py --shard i/N, see shards.py) into the output files, e.g. after
+# all the tasks of an array job have finished:
+#
+#   python main.py -o filtered.csv --shard 1/4    (and 2/4, 3/4 and 4/4)
+#   python merge.py -o filtered.csv -op filtered_phen.csv --shards 4
+#
+# The output files are the same as those of main.py run without --shard,
+# with the same --output as the shards, and are written in the format of
+# their names (see output.py).
+
+import argparse
+import sys
+
+import pandas as pd
+from shards import *
+from output import *
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('-o', '--output', default="filtered.csv")
+    argp.add_argument('-op', '--output_phen', default="filtered_phen.csv")
+    argp.add_argument('--shards', required = True, type = int)
+    argp.add_argument('--clean', default = False, action = 'store_true')
+    args = argp.parse_args()
+
+    try:
+        famresults, famresults_p = read_shards(args.output, args.shards)
+        check_output(args.output)
+        if famresults_p is not None:
+            check_output(args.output_phen)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    # organize the results the same way as main.py
+    result = pd.concat(famresults) if len(famresults) > 0 else pd.DataFrame()
+    if len(result.columns) > 0:
+        result = result.sort_values(SORT_COLUMNS)
+    write_frame(result, args.output)
+
+    if famresults_p is not None:
+        result_p = pd.concat(famresults_p) if len(famresults_p) > 0 else pd.DataFrame()
+        if len(result_p.columns) > 0:
+            result_p = result_p.sort_values(SORT_COLUMNS_PHEN)
+        write_frame(result_p, args.output_phen)
+
+    # the partial outputs are kept unless --clean is given, so that the
+    # shards can be merged again
+    if args.clean:
+        remove_shards(args.output, args.shards)
+
+    print("Merged", args.shards, "shards with", len(result), "candidates into", args.output)
+    if famresults_p is not None:
+        print("and", len(result_p), "candidates with the phenotype filter into", args.output_phen)
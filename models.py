@@ -13,6 +13,7 @@
 
 from family import Family
 from filters import *
+import numpy as np
 import pandas as pd
 
 #add_columns adds three columns to the dataFrame df containing info to be outputted for
@@ -27,43 +28,35 @@ def add_columns(df, fam, model):
 # containing candidate variants
 def ad_model(df, fam, include_singleton = False):
     min_allelic_depth = 6  # will filter for 6x coverage minimum for at least one affected individ
-    numAffected = 0
-    newdf = df.copy()
-    newdf = filter_AF(newdf, .0005)  # filters all AF cols for entries <= .0005
-    dpdf = pd.DataFrame()
-    names = []
-    for person in fam.people:
-        if person.affected:
-            names.append(person.ID)
-            numAffected += 1
-            newdf = filter_zyg(newdf, person.ID, "0/1")  # filters for 0/1 entries for affected individs
-        else:
-            newdf = filter_zyg(newdf, person.ID, "0/0")  # filters for 0/0 entries for unaffected individs
+    names = [person.ID for person in fam.people if person.affected]
 
     # returns an empty Data Frame if nothing should be output for this model (<= 1 affected individs
     # or they are a singleton)
     noparents = not fam.hasFather and not fam.hasMother
 
-    if numAffected == 0: return pd.DataFrame()
+    if len(names) == 0: return pd.DataFrame()
     elif not include_singleton and noparents: return pd.DataFrame()
-    else:
-        newdf = filter_DP_Max(newdf, names, min_allelic_depth,0)
-        add_columns(newdf, fam, "ad")  # adds on columns with family info
-        return newdf
+
+    # combine the masks of the filters and select the rows once. the masks
+    # are shared with other models and subfamilies, so they are combined
+    # into new arrays rather than changed in place
+    keep = AF_mask(df, .0005)  # filters all AF cols for entries <= .0005
+    for person in fam.people:
+        if person.affected:
+            keep = keep & zyg_mask(df, person.ID, "0/1")  # filters for 0/1 entries for affected individs
+        else:
+            keep = keep & zyg_mask(df, person.ID, "0/0")  # filters for 0/0 entries for unaffected individs
+    keep = keep & DP_mask(df, names, min_allelic_depth)
+
+    newdf = select_rows(df, keep, [person.ID for person in fam.people])
+    add_columns(newdf, fam, "ad")  # adds on columns with family info
+    return newdf
 
 # de_novo_model takes a dataframe (the cleaned data) and a family object
 # return value: a new dataframe with all possible de novo candidate
 # genes
 def de_novo_model(df, fam, include_singleton = False):
 
-    # re-filter for MAF
-    revised_df = df.copy()
-    revised_df = filter_AF(revised_df, .0005)
-    
-    # keep track of number of individuals we are identifying variants
-    # for
-    num_affected = 0
-
     # If either mother or father is affected, no de novo, so return
     # empty data frame
     if fam.mother.affected or fam.father.affected:
@@ -72,30 +65,41 @@ def de_novo_model(df, fam, include_singleton = False):
     noparents = not fam.hasMother and not fam.hasFather
     if noparents and not include_singleton:
         return pd.DataFrame()
+
+    # re-filter for MAF, combining the masks of the filters and selecting
+    # the rows once (see ad_model)
+    keep = AF_mask(df, .0005)
+
+    # keep track of number of individuals we are identifying variants
+    # for, and of everyone whose genotype is filtered
+    num_affected = 0
+    names = [fam.father.ID, fam.mother.ID]
    
     # filter child for all 0/1
     if fam.child.ID != "":
         num_affected += 1
-        revised_df = filter_zyg(revised_df, fam.child.ID, "0/1")
-        
+        names.append(fam.child.ID)
+        keep = keep & zyg_mask(df, fam.child.ID, "0/1")
 	# filter to make sure DP is at least 6x
-        revised_df = filter_DP(revised_df, fam.child.ID, 6)
+        keep = keep & DP_mask(df, [fam.child.ID], 6)
 
     # filter parents for 0/0
-    revised_df = filter_zyg(revised_df, fam.father.ID, "0/0")
-    revised_df = filter_zyg(revised_df, fam.mother.ID, "0/0")
+    keep = keep & zyg_mask(df, fam.father.ID, "0/0")
+    keep = keep & zyg_mask(df, fam.mother.ID, "0/0")
 
     # filter siblings to identify more candidate genes
     for sib in fam.siblings:
+        names.append(sib.ID)
         if sib.affected:
             num_affected += 1
-            revised_df = filter_zyg(revised_df, sib.ID, "0/1")
-            revised_df = filter_DP(revised_df, sib.ID, 6)
+            keep = keep & zyg_mask(df, sib.ID, "0/1")
+            keep = keep & DP_mask(df, [sib.ID], 6)
         else:
-            revised_df = filter_zyg(revised_df, sib.ID, "0/0")
+            keep = keep & zyg_mask(df, sib.ID, "0/0")
     
     if num_affected:
 
+        revised_df = select_rows(df, keep, names)
         # add on the columns with family info
         add_columns(revised_df, fam, "addn")
         return revised_df
@@ -103,6 +107,15 @@ def de_novo_model(df, fam, include_singleton = False):
     # if no affected individuals, return empty data frame
     return pd.DataFrame()
 
+# get the gene of each variant in the data frame df: the first of the genes
+# in its Gene.refGene column (which can list several, separated by semicolons).
+# the genes of the parsed data frame are only split once (see frame_array),
+# for the ch model of every subfamily
+def gene_names(df):
+    genes = frame_array(df, ("gene", None, None),
+                        lambda df: df["Gene.refGene"].str.split(";", n=1).str[0], object)
+    return pd.Series(genes, index=df.index)
+
 def cmpd_het_model(df, fam):
    
     # keep track of individuals we are identifying variants for
@@ -113,92 +126,102 @@ def cmpd_het_model(df, fam):
     # create newdf to include all instances of child 0/1
     if fam.child.ID != "":
         num_affected += 1
-        newdf = df.copy()
-        newdf = filter_zyg(newdf, fam.child.ID, "0/1")
-	
-        # use Gene.refGene column to create new column "Gene' with
-        # gene names (deals with semicolon issue in some genes)
-        partitioned_gene=0
-        newdf.loc[:,'Gene'] = ''
-        newdf=newdf.dropna(subset=["Gene.refGene"])
-        newdf = newdf.reset_index(drop=True)
-        newdf['Gene'] = newdf["Gene.refGene"].copy().str.partition(";")[0]
-        
-        # create new df where genes must meet the following criteria: 
+        # the positions of the rows that filter_zyg keeps, which are only
+        # selected at the end
+        child = np.flatnonzero(unique_mask(df, zyg_mask(df, fam.child.ID, "0/1"),
+                                           [fam.child.ID]))
+
+        # get the gene names from the Gene.refGene column (deals with
+        # semicolon issue in some genes), for the variants that have one.
+        # those of the whole data frame are shared with other subfamilies
+        genes = gene_names(df).iloc[child].reset_index(drop=True)
+
+        # keep the genes with at least two variants, that also meet the
+        # following criteria:
 	# there must be at least 1 0/1 variant in mother that is not in father
 	# and at least 1 0/1 variant in father that is not in mother
-        finaldf = newdf[newdf.duplicated(subset=['Gene'], keep=False)] 
+        keep = (genes.notna() & genes.duplicated(keep=False)).values
         if(fam.hasFather or fam.hasMother):
-            genes = finaldf["Gene"].unique()
             both_available = fam.hasFather and fam.hasMother
-            if not both_available:
+            # flag the variants that count towards each of the two criteria
+            if(both_available):
+                mom = (has_zyg(df, fam.mother.ID, "0/1") &
+                       has_zyg(df, fam.father.ID, "0/0"))
+                dad = (has_zyg(df, fam.mother.ID, "0/0") &
+                       has_zyg(df, fam.father.ID, "0/1"))
+                flags = {"mom": mom, "dad": dad}
+            else:
                 available_ID = fam.father.ID if fam.hasFather else fam.mother.ID
-            for gene in genes:
-                genedf = finaldf[finaldf["Gene"]==gene]
-                if(both_available):
-                    mom = sum(genedf[fam.mother.ID].str.contains("0/1") &
-                              genedf[fam.father.ID].str.contains("0/0"))
-                    dad = sum(genedf[fam.mother.ID].str.contains("0/0") &
-                              genedf[fam.father.ID].str.contains("0/1"))
-                    if(mom==0 or dad==0):
-                        finaldf = finaldf[finaldf["Gene"]!=gene]
-                else:
-                    parentvariants = sum(genedf[available_ID].str.contains("0/1"))
-                    parentnonvariants = sum(genedf[available_ID].str.contains("0/0"))
-                    if(parentvariants == 0 or parentnonvariants == 0):
-                        finaldf = finaldf[finaldf["Gene"]!=gene]
-
-        # delete the gene column we created
-        del finaldf['Gene']
+                parentvariants = has_zyg(df, available_ID, "0/1")
+                parentnonvariants = has_zyg(df, available_ID, "0/0")
+                flags = {"variants": parentvariants, "nonvariants": parentnonvariants}
+
+            # count the flagged variants of every gene at once, and keep the
+            # genes that have at least one variant for each criterion
+            counts = pd.DataFrame({key: np.asarray(flag)[child][keep]
+                                   for key, flag in flags.items()})
+            counts = counts.groupby(genes.values[keep], sort=False).sum()
+            keep = keep & genes.isin(counts.index[(counts > 0).all(axis=1)]).values
+
+        # select the rows once
+        finaldf = df.iloc[child[keep]].copy()
         
     # add on the columns with family info
     if num_affected:
         add_columns(finaldf, fam, "ch")
         return finaldf
 
+# get the positions (rows) of the variants that the X-linked models keep when
+# a person may have either of two genotypes, e.g. 1/1 or hemizygous 1:, in
+# the order they keep them: first the rows where the boolean mask (first) is
+# True, then the other rows where (second) is
+def either_rows(rows, first, second):
+    first = first[rows]
+    return np.concatenate([rows[first], rows[second[rows] & ~first]])
+
 def xl_model(df, fam):
-    newdf = df.copy()
-    x_df = filter_chr(newdf, "chrX")
+    # the positions of the chrX variants are taken once, and the filters of
+    # every person pick among them, so that the rows are only copied at the
+    # end. the masks and row hashes of the parsed data frame are shared by
+    # every subfamily (see frame_array), and indexed by these positions
+    rows = chr_rows(df, "chrX")
     for person in fam.people:
         if person.affected:
             if not person.male:
                 return pd.DataFrame()
-            x_df_1 = filter_zyg(x_df, person.ID, "1/1")
-            x_df_2 = filter_1x_zyg(x_df, person.ID, "1:")
-            x_df = x_df_1.append(x_df_2)
+            rows = either_rows(rows, zyg_mask(df, person.ID, "1/1"),
+                               zyg_1x_mask(df, person.ID, "1:"))
         if person.unaffected:
-            x_df_1 = exclude_zyg(x_df, person.ID, "1/1")
-            x_df_2 = exclude_1x_zyg(x_df, person.ID, "1:")
-            x_df = x_df_1.append(x_df_2)
+            rows = either_rows(rows, zyg_mask(df, person.ID, "1/1", exclude = True),
+                               zyg_1x_mask(df, person.ID, "1:", exclude = True))
             if person.male:
-                x_df_1 = filter_zyg(x_df, person.ID, "0/0")
-                x_df_2 = filter_1x_zyg(x_df, person.ID, "0:")
-                x_df = x_df_1.append(x_df_2)
+                rows = either_rows(rows, zyg_mask(df, person.ID, "0/0"),
+                                   zyg_1x_mask(df, person.ID, "0:"))
     if not fam.father.affected:
-        x_df = filter_zyg(x_df, fam.mother.ID, "0/1")
+        rows = rows[zyg_mask(df, fam.mother.ID, "0/1")[rows]]
 
+    x_df = select_rows(df, rows, [person.ID for person in fam.people], af = False)
     add_columns(x_df, fam, "xl")
     return(x_df)
 
 def xldn_model(df, fam):
-    newdf = df.copy()
-    x_df = filter_chr(newdf, "chrX")
     if fam.mother.affected or fam.father.affected:
         return pd.DataFrame()
     if fam.child.female:
         return pd.DataFrame()
-    # filter child for all 0/1
+    # filter child for all 0/1 (see xl_model)
+    rows = chr_rows(df, "chrX")
     for person in fam.people:
         if person.affected:
             if not person.male:
                 return pd.DataFrame()
-            x_df_1 = filter_zyg(x_df, person.ID, "1/1")
-            x_df_2 = filter_1x_zyg(x_df, person.ID, "1:")
-            x_df = x_df_1.append(x_df_2)
+            rows = either_rows(rows, zyg_mask(df, person.ID, "1/1"),
+                               zyg_1x_mask(df, person.ID, "1:"))
         if person.unaffected:
-            x_df_1 = filter_zyg(x_df, person.ID, "0/0")
-            x_df_2 = filter_1x_zyg(x_df, person.ID, "0:")
-            x_df = x_df_1.append(x_df_2)
+            rows = either_rows(rows, zyg_mask(df, person.ID, "0/0"),
+                               zyg_1x_mask(df, person.ID, "0:"))
+
+    x_df = select_rows(df, rows, [person.ID for person in fam.people], af = False)
     add_columns(x_df, fam, "xldn")
     return(x_df)
     
@@ -207,26 +230,26 @@ def xldn_model(df, fam):
 # all possible autosomal recessive candidate genes
 def ar_model(df, fam):
     min_allelic_depth = 6  # will filter for 6x coverage minimum for at least one affected individ
-    numAffected = 0
-    newdf = df.copy()
-    newdf = filter_AF(newdf, .005) 
-    newdf = filter_chr(newdf, "chrX", exclude=True)
-    dpdf = pd.DataFrame()
-    names = []
+    names = [person.ID for person in fam.people if person.affected]
+
+    # returns an empty Data Frame if nothing should be output for this model (<= 1 affected individs)
+    if len(names) < 1:
+        return pd.DataFrame()
+
+    # combine the masks of the filters and select the rows once (see
+    # ad_model)
+    keep = AF_mask(df, .005)
+    if "Chr" in df.columns:
+        keep = keep & ~chr_mask(df, "chrX")
     for person in fam.people:
         if person.affected:
-            names.append(person.ID)
-            numAffected += 1
-            newdf = filter_zyg(newdf, person.ID, "1/1") 
+            keep = keep & zyg_mask(df, person.ID, "1/1")
         else:
-            newdf = exclude_zyg(newdf, person.ID, "1/1")
+            keep = keep & zyg_mask(df, person.ID, "1/1", exclude = True)
             if person == fam.father or person == fam.mother:
-                newdf = filter_zyg(newdf, person.ID, "0/1")
-    # returns an empty Data Frame if nothing should be output for this model (<= 1 affected individs)
-    if numAffected < 1:
-        return pd.DataFrame()
-    else:
-        newdf = filter_DP_Max(newdf, names, min_allelic_depth,0)
-        add_columns(newdf, fam, "ar")  # adds on columns with family info
-        return newdf
-    
+                keep = keep & zyg_mask(df, person.ID, "0/1")
+    keep = keep & DP_mask(df, names, min_allelic_depth)
+
+    newdf = select_rows(df, keep, [person.ID for person in fam.people])
+    add_columns(newdf, fam, "ar")  # adds on columns with family info
+    return newdf
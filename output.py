@@ -0,0 +1,237 @@
+# This file is for writing the output files of VIA.
+#
+# The format of an output file is chosen by the ending of its name:
+# - .csv (or any other ending): a CSV file
+# - .csv.gz, .csv.bz2, .csv.xz or .csv.zst: a CSV file compressed with gzip,
+#   bzip2, xz or zstd (zstd needs the zstandard package)
+# - .parquet: a Parquet file (needs the pyarrow or fastparquet package), with
+#   the text columns stored as strings
+#
+# The output can also be streamed (--stream-output) instead of put together
+# in memory: the candidates of the families are added as each family is
+# filtered, and once (STREAM_ROWS) of them are held, they are sorted and
+# written to a temporary CSV file (a run). When every family is filtered, the
+# runs are merged into the output file a row at a time, so the memory needed
+# does not grow with the number of candidates. The merge keeps rows with the
+# same sort columns in the order they were added, as sorting the whole output
+# at once does, so the output is the same as without --stream-output.
+
+import bz2
+import csv
+import gzip
+import heapq
+import lzma
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from loading import *
+
+# the columns the output files are sorted by, without and with the phenotype
+# filter
+SORT_COLUMNS = ['sample', 'inh model']
+SORT_COLUMNS_PHEN = ['family', 'phens_matched', 'sample']
+
+# the compressions of CSV output files, from the endings of their names
+CSV_COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# the number of candidates held by a streamed output before they are written
+# to a run
+STREAM_ROWS = 20000
+
+# whether the output file (path) is a Parquet file, from its name
+def is_parquet(path):
+    return path.lower().endswith(".parquet")
+
+# get the compression of the CSV output file (path) from its name, or None
+def csv_compression(path):
+    for suffix, compression in CSV_COMPRESSIONS.items():
+        if path.lower().endswith(suffix):
+            return compression
+    return None
+
+# check that the output file (path) can be written, before anything is
+# filtered, and if stream is True, that it can be streamed.
+# raises a ValueError if it cannot
+def check_output(path, stream = False):
+    if is_parquet(path):
+        if stream:
+            raise ValueError("--stream-output writes CSV files, not " + path)
+        try:
+            import pyarrow
+        except ImportError:
+            try:
+                import fastparquet
+            except ImportError:
+                raise ValueError("Writing the Parquet file " + path + " needs the pyarrow or "
+                                 "fastparquet package (pip install pyarrow).")
+    elif csv_compression(path) == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("Writing the zstd file " + path + " needs the zstandard "
+                             "package (pip install zstandard).")
+    elif stream and path.lower().endswith(".zip"):
+        raise ValueError("--stream-output cannot write the zip file " + path)
+
+# write a dataframe of candidates (df) to the output file (path), in the
+# format of its name. CSV files are compressed by open_output rather than by
+# pandas, as older versions of pandas do not know every compression (e.g.
+# zstd) from the name
+def write_frame(df, path):
+    if is_parquet(path):
+        # text columns (which may also hold numbers, e.g. "." for a missing
+        # allele frequency) are stored as strings
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].astype("string")
+        df.to_parquet(path)
+    elif path.lower().endswith(".zip"):
+        # a zip archive is written by pandas, which names the file in it
+        df.to_csv(path, compression="zip")
+    else:
+        with open_output(path) as f:
+            df.to_csv(f)
+
+# open the CSV output file (path) for writing text, compressed as its name
+# says
+def open_output(path):
+    compression = csv_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "wt", newline="")
+    if compression == "bz2":
+        return bz2.open(path, "wt", newline="")
+    if compression == "xz":
+        return lzma.open(path, "wt", newline="")
+    if compression == "zstd":
+        import zstandard
+        return zstandard.open(path, "wt", newline="")
+    return open(path, "w", newline="")
+
+# get the first (n) fields of a CSV record (record), as csv.reader would
+def leading_fields(record, n):
+    fields = []
+    i = 0
+    while len(fields) < n:
+        if record.startswith('"', i):
+            # a quoted field, in which a quote is written twice
+            j = record.index('"', i + 1)
+            while record.startswith('"', j + 1):
+                j = record.index('"', j + 2)
+            fields.append(record[i + 1:j].replace('""', '"'))
+            i = j + 2
+        else:
+            j = record.find(",", i)
+            if j == -1:
+                fields.append(record[i:].rstrip("\r\n"))
+                break
+            fields.append(record[i:j])
+            i = j + 1
+    return fields
+
+# get the records of a CSV file opened with newline="" (f) as text, with
+# their line endings. a record with a line break in a quoted field spans
+# several lines
+def read_records(f):
+    for record in f:
+        while record.count('"') % 2 == 1:
+            record += next(f)
+        yield record
+
+# merge the runs (paths, CSV files with the same header, each sorted by the
+# columns (columns)) into the CSV output file (output), keeping the records
+# with the same columns in the order of the runs. the columns whose names
+# are in (numeric) are compared as numbers.
+# only the fields up to the last of the columns are parsed, and the records
+# are copied as they are
+def merge_runs(paths, output, columns, numeric):
+    files = [open(path, newline="") for path in paths]
+    try:
+        runs = [read_records(f) for f in files]
+        header = [next(run) for run in runs][0]
+        names = next(csv.reader([header]))
+        positions = [(names.index(col), col in numeric) for col in columns]
+        n = max(i for i, number in positions) + 1
+        def key(record):
+            fields = leading_fields(record, n)
+            return tuple(float(fields[i]) if number else fields[i] for i, number in positions)
+
+        with open_output(output) as out:
+            out.write(header)
+            # heapq.merge takes records with the same key from the earlier
+            # run first
+            out.writelines(heapq.merge(*runs, key=key))
+    finally:
+        for f in files:
+            f.close()
+
+# A streamed output (see --stream-output): the candidates of the families
+# without and, if output_phen is given, with the phenotype filter, written
+# to the output files (output and output_phen) when it is closed. If data is
+# given, the columns that were not loaded (see --prune-columns) are read back
+# in from that data file for every run.
+class OutputStream:
+    def __init__(self, output, output_phen = None, data = None):
+        self.outputs = [output] + ([output_phen] if output_phen is not None else [])
+        self.sort_columns = [SORT_COLUMNS, SORT_COLUMNS_PHEN]
+        self.data = data
+        self.directory = tempfile.mkdtemp(prefix=".via-runs-",
+                                          dir=os.path.dirname(os.path.abspath(output)))
+        self.batches = [[] for path in self.outputs]
+        self.held = 0
+        self.runs = [[] for path in self.outputs]
+        self.columns = [None for path in self.outputs]
+        self.numeric = [set() for path in self.outputs]
+        self.rows = [0 for path in self.outputs]
+
+    # add the candidates of a family without (famresult) and with
+    # (famresult_p) the phenotype filter
+    def add(self, famresult, famresult_p = None):
+        for batch, df in zip(self.batches, [famresult, famresult_p]):
+            # empty dataframes without columns (e.g. from a family without
+            # phenotypes) add nothing
+            if len(df.columns) > 0:
+                batch.append(df)
+                self.held += len(df)
+        if self.held >= STREAM_ROWS:
+            self.flush()
+
+    # sort the held candidates and write them to a run of each output file
+    def flush(self):
+        batches = [pd.concat(batch) if len(batch) > 0 else None for batch in self.batches]
+        self.batches = [[] for path in self.outputs]
+        self.held = 0
+        if self.data is not None:
+            nonempty = [df for df in batches if df is not None]
+            joined = iter(join_columns(nonempty, self.data))
+            batches = [next(joined) if df is not None else None for df in batches]
+
+        for k, df in enumerate(batches):
+            if df is None:
+                continue
+            if self.columns[k] is None:
+                self.columns[k] = list(df.columns)
+                self.numeric[k] = {col for col in self.sort_columns[k]
+                                   if pd.api.types.is_numeric_dtype(df[col])}
+            df = df.reindex(columns=self.columns[k]).sort_values(self.sort_columns[k])
+            path = os.path.join(self.directory, str(k) + "." + str(len(self.runs[k])) + ".csv")
+            with open(path, "w", newline="") as f:
+                df.to_csv(f)
+            self.runs[k].append(path)
+            self.rows[k] += len(df)
+
+    # write the output files from the runs, and remove the runs.
+    # returns a list of the number of candidates in each output file
+    def close(self):
+        try:
+            self.flush()
+            for k, path in enumerate(self.outputs):
+                if len(self.runs[k]) == 0:
+                    # as the output of families without any candidates
+                    write_frame(pd.DataFrame(), path)
+                else:
+                    merge_runs(self.runs[k], path, self.sort_columns[k], self.numeric[k])
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        return self.rows
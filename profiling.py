@@ -0,0 +1,162 @@
+# This file is for the report of a run (--profile-report): the wall time, CPU
+# time, memory and numbers of rows in and out of every stage of the run,
+# of every family and of every inheritance model, written to a JSON file.
+#
+# Stages are recorded with profile_stage, which does nothing unless a report
+# was started with start_report. Worker processes return their records with
+# the results of their families (see call_reported), so the report has the
+# families and models of every process.
+
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # the peak memory is not reported on systems without the resource module
+    # (Windows)
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+# the records of the stages timed in this process, or None if no report is
+# being made
+_records = None
+
+# the wall and CPU time when the report was started
+_started = None
+
+# the dicts of the stages being recorded in this process, the innermost last
+_open = []
+
+# start recording stages for the report of this run
+def start_report():
+    global _records, _started
+    _records = []
+    _started = (datetime.datetime.now(), time.perf_counter(), time.process_time())
+
+# whether stages are being recorded for a report
+def reporting():
+    return _records is not None
+
+# get the peak resident memory of this process (or of its finished worker
+# processes, if children is True) so far, in megabytes, or None if it is not
+# known
+def peak_rss(children = False):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 << 20 if sys.platform == "darwin" else 1 << 10
+    return round(usage.ru_maxrss / scale, 1)
+
+# get the CPU time of the finished worker processes of this process, or None
+# if it is not known
+def cpu_workers():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return round(usage.ru_utime + usage.ru_stime, 6)
+
+# record the stage (stage) of the code run inside the with statement, for the
+# family (family) and the inheritance model (model) if given, with the
+# number of rows it was given (rows_in).
+# the memory of a stage is how much it raised the peak memory of its process
+# (peak_rss_increase_mb): the peak of a process only grows, so a stage that
+# stays below the peak of the stages before it in the process gets 0.
+# the with statement gets a dict, to which the number of rows the stage
+# returned can be added (e.g. record["rows_out"] = len(df)), along with
+# anything else to report about it
+@contextlib.contextmanager
+def profile_stage(stage, family = None, model = None, rows_in = None, **fields):
+    record = {}
+    if _records is None:
+        yield record
+        return
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    peak = peak_rss()
+    _open.append(record)
+    try:
+        yield record
+    finally:
+        _open.pop()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    if peak is not None:
+        peak = round(peak_rss() - peak, 1)
+
+    entry = {"stage": stage}
+    if family is not None:
+        entry["family"] = family
+    if model is not None:
+        entry["model"] = model
+    entry.update(fields)
+    if rows_in is not None:
+        entry["rows_in"] = rows_in
+    entry.update(record)
+    entry.update({"wall": round(wall, 6), "cpu": round(cpu, 6),
+                  "peak_rss_increase_mb": peak, "pid": os.getpid()})
+    _records.append(entry)
+
+# add fields (fields) to the record of the innermost stage being recorded, for
+# code that does not get the dict of the stage (see profile_stage)
+def add_fields(**fields):
+    if len(_open) > 0:
+        _open[-1].update(fields)
+
+# call a function (job) on an argument (arg), recording its stages even in a
+# worker process that did not start the report.
+# returns a tuple of the result and the records of the call, which the
+# process that started the report adds to its own with add_records
+def call_reported(job, arg):
+    global _records
+    if _records is None:
+        _records = []
+    start = len(_records)
+    result = job(arg)
+    records = _records[start:]
+    del _records[start:]
+    return result, records
+
+# add the records of another process (records), as returned by call_reported
+def add_records(records):
+    if _records is not None:
+        _records.extend(records)
+
+# get the number of rows of a result of a stage (df), which may be None
+def row_count(df):
+    return 0 if df is None else len(df)
+
+# write the report of this run to a JSON file (path), with the records of
+# every stage split into those of the whole run ("stages"), of each family
+# ("families") and of each inheritance model ("models").
+# the peak memory of the run is the cumulative peak of this process and of
+# the largest of its finished worker processes
+def write_report(path):
+    started, wall, cpu = _started
+    report = {
+        "command": sys.argv,
+        "started": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "wall": round(time.perf_counter() - wall, 6),
+        "cpu": round(time.process_time() - cpu, 6),
+        "peak_rss_mb": peak_rss(),
+        "cpu_workers": cpu_workers(),
+        "peak_rss_workers_mb": peak_rss(children = True),
+        "stages": [record for record in _records if "family" not in record],
+        "families": [record for record in _records
+                     if "family" in record and "model" not in record],
+        "models": [record for record in _records if "model" in record],
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,103 @@
+# This file is for restricting a run to some regions of the genome
+# (--regions), e.g. the genes of a panel, so that only the variants in them
+# are decoded and filtered.
+#
+# The regions file has one region per line, either as a BED interval
+# (chromosome, start and end, separated by tabs, with the start counted from
+# 0 and the end not included) or as a single gene symbol, which matches the
+# variants with that gene in their Gene.refGene column. Empty lines and
+# "#", "track" and "browser" lines are skipped.
+#
+# The variants are found with an index of their positions: the rows of each
+# chromosome sorted by Start, which is searched with binary search for each
+# interval instead of comparing every variant with every interval.
+
+import numpy as np
+import pandas as pd
+
+# get the name of a chromosome (chrom) without the "chr" in front of it, so
+# that "chr1" in the data file matches "1" in a BED file and the other way
+# around
+def chrom_name(chrom):
+    chrom = str(chrom)
+    return chrom[3:] if chrom.lower().startswith("chr") else chrom
+
+# read the regions file (path).
+# returns a tuple of a dataframe of the BED intervals, with the columns
+# "chrom" (see chrom_name), "start" and "end" as in the BED file, and a list
+# of the gene symbols
+def read_regions(path):
+    intervals = []
+    genes = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split()
+            if len(fields) == 0 or fields[0].startswith("#") or fields[0] in ["track", "browser"]:
+                continue
+            if len(fields) == 1:
+                genes.append(fields[0])
+                continue
+            try:
+                start, end = int(fields[1]), int(fields[2])
+            except (IndexError, ValueError):
+                raise ValueError("Line " + str(number) + " of the regions file " + path +
+                                 " is neither a BED interval nor a gene symbol.")
+            intervals.append((chrom_name(fields[0]), start, end))
+
+    intervals = pd.DataFrame(intervals, columns=["chrom", "start", "end"])
+    return intervals, genes
+
+# get an index of the positions of the variants in a dataframe (df): a dict
+# of chromosome names (see chrom_name) and tuples of the positions of the
+# rows of the chromosome sorted by Start, their Start, their End, and the
+# longest span (End - Start) of any of them.
+# rows whose Start or End is not a number are not in the index
+def region_index(df):
+    starts = pd.to_numeric(df["Start"], errors="coerce").values
+    ends = pd.to_numeric(df["End"], errors="coerce").values
+    # (insertions may have an End before their Start)
+    ends = np.fmax(ends, starts)
+    chroms = np.asarray(df["Chr"].map(chrom_name), dtype=object)
+
+    index = {}
+    codes, names = pd.factorize(chroms)
+    for code, chrom in enumerate(names):
+        rows = np.flatnonzero((codes == code) & ~np.isnan(starts) & ~np.isnan(ends))
+        rows = rows[np.argsort(starts[rows], kind="mergesort")]
+        if len(rows) > 0:
+            index[chrom] = (rows, starts[rows], ends[rows], (ends[rows] - starts[rows]).max())
+    return index
+
+# get the positions of the rows of a dataframe (df) that overlap a BED
+# interval of a chromosome (see chrom_name), from the start (counted from 0)
+# to the end (not included), in an index of the dataframe (index, see
+# region_index)
+def interval_rows(index, chrom, start, end):
+    if chrom not in index:
+        return np.array([], dtype=np.int64)
+    rows, starts, ends, span = index[chrom]
+    # the Start and End of the variants are counted from 1 and included, so
+    # they overlap the interval if Start <= end and End >= start + 1. no
+    # variant starting before start + 1 - span can reach the interval
+    first = np.searchsorted(starts, start + 1 - span, side="left")
+    last = np.searchsorted(starts, end, side="right")
+    found = slice(first, last)
+    return rows[found][ends[found] >= start + 1]
+
+# get the positions of the rows of a dataframe of variants (df) in the
+# regions (regions, as returned by read_regions), in the order of df
+def region_rows(df, regions):
+    intervals, genes = regions
+    found = [np.array([], dtype=np.int64)]
+
+    if len(intervals) > 0:
+        index = region_index(df)
+        for chrom, start, end in intervals.itertuples(index=False):
+            found.append(interval_rows(index, chrom, start, end))
+
+    if len(genes) > 0:
+        # the variants with a panel gene among the genes of Gene.refGene
+        split = df["Gene.refGene"].reset_index(drop=True).astype(str).str.split(";").explode()
+        found.append(np.unique(split.index[split.isin(genes)].values))
+
+    return np.unique(np.concatenate(found))
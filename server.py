@@ -0,0 +1,218 @@
+# This file is for running VIA as a server, which loads the variant data file,
+# the genotypes of the pedigree and the HPO index once, and then filters one
+# family at a time for each request, over HTTP on the local machine:
+#
+#   python server.py -p Test_Ped.txt -d Test_cleaned.txt --port 8080
+#
+# Requests:
+# - GET /families: the IDs of the families in the pedfile, and their HPO
+#   numbers from the phenfile
+# - POST /filter, with a JSON body such as
+#     {"family": "FAM1", "hpo": ["HP:0001250", "HP:0001263"], "models": ["ad", "ch"]}
+#   or GET /filter?family=FAM1&hpo=HP:0001250,HP:0001263&models=ad,ch:
+#   filter the variants for the family. "hpo" replaces the HPO numbers of the
+#   family in the phenfile, and "models" runs only some of the inheritance
+#   models (ad, ar, xl, xldn, addn, ch). The response has the candidates
+#   without ("candidates") and with ("candidates_phen") the phenotype filter,
+#   as lists of rows with the row of each variant in the data file ("row").
+# - POST /reload: load the input files again
+#
+# Before every request, the input files are loaded again if any of them
+# changed (its size or modification time) since they were loaded.
+# Requests are answered one at a time, as the parsed genotypes and the masks
+# of the filters are shared (see genotypes.py).
+
+import argparse
+import copy
+import json
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from family import *
+from utils import *
+
+# the loaded input files: the parsed arguments ("args"), the key of each
+# input file when it was loaded ("files", see file_key), the dict of families
+# ("families"), the dict of HPO numbers to genes ("hpo_genes") and the
+# dataframe of variants ("df")
+_cohort = {}
+
+# get the paths of the input files given in the parsed arguments (args)
+def input_files(args):
+    paths = [args.pedfile, args.data, args.mapfile]
+    if os.path.isfile(args.phenfile):
+        paths.append(args.phenfile)
+    if args.regions is not None:
+        paths.append(args.regions)
+    return paths
+
+# load the input files given in the parsed arguments (args)
+def load_cohort(args):
+    print("Loading", args.data + "...")
+    start = time.perf_counter()
+    files = {path: file_key(path) for path in input_files(args)}
+
+    families = get_families(args.pedfile)
+    hpo_genes = load_hpo_genes(args.mapfile, args.cache)
+    if os.path.isfile(args.phenfile):
+        add_phenotypes(families, args.phenfile, hpo_genes)
+
+    # the samples of everyone in the pedigree
+    samples = [person.ID for fam in families.values() for person in fam.people]
+    columns = read_header(args.data)
+    if args.prune_columns:
+        columns = needed_columns(columns, samples)
+
+    # drop the variants of the previous load before reading the new ones. if
+    # loading fails, the next request tries again
+    _cohort.clear()
+    _cohort["args"] = args
+    clear_gene_index()
+    regions = read_regions(args.regions) if args.regions is not None else None
+    df = load_variants(args.data, samples, columns, args.cache, args.prune_columns, regions,
+                       args.compact)
+    index_genes(df["Gene.refGene"])
+
+    _cohort.update(args = args, files = files, families = families,
+                   hpo_genes = hpo_genes, df = df)
+    print("Loaded", len(df), "variants for", len(families), "families in",
+          round(time.perf_counter() - start, 1), "seconds")
+
+# load the input files again if any of them changed since they were loaded
+def reload_if_changed():
+    args = _cohort["args"]
+    files = {path: file_key(path) for path in input_files(args) if os.path.isfile(path)}
+    if files != _cohort.get("files"):
+        load_cohort(args)
+
+# get the rows of a dataframe of candidates (df) as a list of dicts, with the
+# row of each variant in the data file
+def candidate_rows(df):
+    if len(df.columns) == 0:
+        return []
+    df = df.rename_axis("row").reset_index()
+    return json.loads(df.to_json(orient = "records"))
+
+# filter the variants for the family with the ID (ID), with the HPO numbers
+# (hpo) instead of those in the phenfile if it is not None, and only the
+# inheritance models named in (models) if it is not None.
+# returns a dict with the candidates without and with the phenotype filter
+def filter_request(ID, hpo = None, models = None):
+    positions = None
+    if models is not None:
+        unknown = [name for name in models if name not in MODEL_NAMES]
+        if len(unknown) > 0:
+            raise ValueError("Unknown inheritance models: " + ", ".join(unknown) +
+                             ". Choose from " + ", ".join(MODEL_NAMES) + ".")
+        positions = [MODEL_NAMES.index(name) for name in models]
+
+    # the Family object is copied, so that the HPO numbers of the request do
+    # not change it for later requests
+    fam = copy.copy(_cohort["families"][ID])
+    if hpo is not None:
+        fam.genes = {}
+        add_phen_genes(fam, list(hpo), _cohort["hpo_genes"])
+
+    start = time.perf_counter()
+    famresult, famresult_p = filter_family_both(_cohort["df"], fam, positions)
+    # read the columns that were not loaded and the sample strings of compact
+    # storage back in, for the candidates only
+    if _cohort["args"].prune_columns or _cohort["args"].compact:
+        famresult, famresult_p = join_columns([famresult, famresult_p], _cohort["args"].data)
+    # organize the results the same way as main.py
+    if len(famresult.columns) > 0:
+        famresult = famresult.sort_values(['sample', 'inh model'])
+    if len(famresult_p.columns) > 0:
+        famresult_p = famresult_p.sort_values(['family', 'phens_matched', 'sample'])
+
+    return {"family": ID,
+            "hpo": fam.HPO,
+            "models": models if models is not None else MODEL_NAMES,
+            "seconds": round(time.perf_counter() - start, 6),
+            "candidates": candidate_rows(famresult),
+            "candidates_phen": candidate_rows(famresult_p)}
+
+# get a list from a query parameter or JSON value (value), which may be a
+# list or a string separated by commas, or None if it is None
+def parse_list(value):
+    if value is None or isinstance(value, list):
+        return value
+    return [item for item in str(value).split(",") if item != ""]
+
+# the handler of the requests to the server
+class ViaHandler(BaseHTTPRequestHandler):
+
+    # send the dict (response) as JSON, with the HTTP status (status)
+    def send_json(self, response, status = 200):
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # answer a request for the path (path) with the parameters (params)
+    def answer(self, path, params):
+        try:
+            if path == "/reload":
+                load_cohort(_cohort["args"])
+                return self.send_json({"reloaded": True})
+
+            reload_if_changed()
+            if path == "/families":
+                return self.send_json({ID: fam.HPO for ID, fam in _cohort["families"].items()})
+            if path == "/filter":
+                if "family" not in params:
+                    return self.send_json({"error": "No family given."}, 400)
+                if params["family"] not in _cohort["families"]:
+                    return self.send_json({"error": "There is no family " + str(params["family"]) +
+                                                    " in the pedfile."}, 404)
+                return self.send_json(filter_request(params["family"],
+                                                     parse_list(params.get("hpo")),
+                                                     parse_list(params.get("models"))))
+            return self.send_json({"error": "Unknown path " + path}, 404)
+        except ValueError as e:
+            return self.send_json({"error": str(e)}, 400)
+        except Exception as e:
+            # keep serving, e.g. if an input file could not be loaded again
+            self.log_error("%s", repr(e))
+            return self.send_json({"error": repr(e)}, 500)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        self.answer(url.path, params)
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_json({"error": "The body is not valid JSON."}, 400)
+        self.answer(url.path, params)
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser()
+    argp.add_argument('-p', '--pedfile', default="Test_Ped.txt")
+    argp.add_argument('-d', '--data', default="Test_cleaned.txt")
+    argp.add_argument('-ph', '--phenfile', default="Test_Phen.txt")
+    argp.add_argument('-m', '--mapfile', default="phenotype_to_genes.txt")
+    argp.add_argument('--cache', default = False, action = 'store_true')
+    argp.add_argument('--prune-columns', default = False, action = 'store_true')
+    argp.add_argument('--compact', default = False, action = 'store_true')
+    argp.add_argument('--regions', default = None)
+    argp.add_argument('--host', default = "127.0.0.1")
+    argp.add_argument('--port', default = 8080, type = int)
+    args = argp.parse_args()
+
+    load_cohort(args)
+
+    server = HTTPServer((args.host, args.port), ViaHandler)
+    print("Serving on http://" + args.host + ":" + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
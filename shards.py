@@ -0,0 +1,97 @@
+# This file is for running VIA as several shards (--shard i/N), e.g. as the
+# tasks of an array job on a cluster, each filtering some of the families,
+# and then merging their results into the output files (see merge.py).
+#
+# The families of the pedfile are split into N blocks of consecutive
+# families, as even as possible, and shard i (counted from 1) filters the
+# i-th block. Families are filtered independently of each other, so every
+# shard only decodes the genotypes of the samples of its own families. Each
+# shard writes the results of its families, in the order of the pedfile,
+# to a partial output file next to --output (e.g. filtered.csv.shard2of8.pkl),
+# and merge.py puts the results of the shards together in the order of the
+# shards, so that the output files are the same as those of a single run.
+
+import os
+import pickle
+
+from cache import *
+
+# get the shard number and the number of shards from the text of --shard
+# (text), such as "2/8".
+# raises a ValueError if it is not of that form, with 1 <= i <= N
+def parse_shard(text):
+    try:
+        index, count = [int(part) for part in text.split("/")]
+    except ValueError:
+        raise ValueError("--shard must be given as i/N, e.g. 2/8, not " + text)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("--shard i/N needs 1 <= i <= N, not " + text)
+    return index, count
+
+# get the dict of the families (families) filtered by shard (index) of
+# (count) shards: the (index)-th of (count) blocks of consecutive families
+# in the order of the pedfile
+def shard_families(families, index, count):
+    IDs = list(families)
+    first = len(IDs) * (index - 1) // count
+    last = len(IDs) * index // count
+    return {ID: families[ID] for ID in IDs[first:last]}
+
+# get the path of the partial output of shard (index) of (count) shards,
+# next to the output file (output)
+def shard_path(output, index, count):
+    return output + ".shard" + str(index) + "of" + str(count) + ".pkl"
+
+# write the partial output of shard (index) of (count) shards next to the
+# output file (output): the IDs of the families of the shard (IDs) and the
+# lists of their results without (famresults) and with (famresults_p, None
+# without the phenotype filter) the phenotype filter
+def write_shard(output, index, count, IDs, famresults, famresults_p):
+    shard = {"shard": index, "shards": count, "families": list(IDs),
+             "results": famresults, "results_p": famresults_p}
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            pickle.dump(shard, f, protocol=4)
+    write_atomic(shard_path(output, index, count), write)
+
+# read the partial outputs of the (count) shards written next to the output
+# file (output).
+# returns a tuple of the lists of the results of every family without and
+# with (None without the phenotype filter) the phenotype filter, in the
+# order of the shards.
+# raises a ValueError if a partial output is missing or the shards were run
+# with and without the phenotype filter or for the same family
+def read_shards(output, count):
+    paths = [shard_path(output, index, count) for index in range(1, count + 1)]
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if len(missing) > 0:
+        raise ValueError("The partial outputs of these shards are missing: " + ", ".join(missing))
+
+    famresults, famresults_p = [], []
+    IDs = set()
+    phen = set()
+    for path in paths:
+        with open(path, "rb") as f:
+            shard = pickle.load(f)
+        phen.add(shard["results_p"] is not None)
+        if len(phen) > 1:
+            raise ValueError("Some of the shards were run with --nophen and some without it.")
+        repeated = IDs.intersection(shard["families"])
+        if len(repeated) > 0:
+            raise ValueError("The families " + ", ".join(sorted(repeated)) +
+                             " are in more than one shard.")
+        IDs.update(shard["families"])
+
+        famresults += shard["results"]
+        if shard["results_p"] is not None:
+            famresults_p += shard["results_p"]
+
+    if phen == {False}:
+        famresults_p = None
+    return famresults, famresults_p
+
+# remove the partial outputs of the (count) shards written next to the output
+# file (output)
+def remove_shards(output, count):
+    for index in range(1, count + 1):
+        os.remove(shard_path(output, index, count))
@@ -0,0 +1,253 @@
+# This file is for filtering variant data files that are too large to load at
+# once, reading them a chunk of rows at a time (--chunksize).
+#
+# Most inheritance models (ad, ar, xl, xldn, addn) look at each variant on its
+# own, so they are run on every chunk and their results kept. Once the whole
+# file has been read, each model is run once more on the variants it kept
+# from all of the chunks, which puts them in the same order (and removes the
+# same duplicated rows) as filtering the whole file at once.
+#
+# The compound heterozygous model (ch) looks at all of the variants of a gene
+# together, so the variants of a gene must be next to each other in the data
+# file. Rows at the end of a chunk whose gene may continue in the next chunk
+# are held back and filtered with the next chunk, and a gene that appears
+# again after it was filtered is an error.
+#
+# With more than one job, one pool of worker processes filters the families
+# of every chunk. Each chunk, with its parsed genotypes, is written once to a
+# temporary file, which every worker loads the first time it filters a
+# family of that chunk.
+
+import functools
+import os
+import pickle
+import shutil
+import tempfile
+
+import pandas as pd
+from utils import *
+
+# the columns that add_columns adds to the results of the models
+ADDED_COLUMNS = ["inh model", "family", "sample"]
+
+# the position of the ch model in MODELS, the only one that is not run again
+# on the variants kept from every chunk
+CH_MODEL = 5
+
+# split a chunk of variants (df) into the rows whose genes are complete and
+# the rows at the end that need to wait for the next chunk, because their
+# genes (or those of rows in between) may continue there.
+# (genes) is the set of genes that were already filtered, which is updated.
+# if last is True, the chunk is the end of the data file and nothing is held
+# back.
+# returns a tuple of the complete rows and the held back rows
+def split_genes(df, genes, last = False):
+    names = gene_names(df).reset_index(drop = True)
+
+    reappearing = set(names.dropna()) & genes
+    if len(reappearing) > 0:
+        raise ValueError("The variants of gene " + sorted(reappearing)[0] +
+                         " are not next to each other in the data file, which "
+                         "--chunksize needs. Sort the data file by gene or use "
+                         "a larger --chunksize.")
+
+    # the position of the first row of every gene in the chunk
+    first = names.dropna().drop_duplicates()
+    first = pd.Series(first.index, index = first.values)
+
+    start = len(df)
+    if not last and len(first) > 0:
+        # hold back the rows from the first row of the last gene, and keep
+        # going back to the first row of any gene among them
+        start = first[names.dropna().iloc[-1]]
+        while True:
+            earliest = first[names[start:].dropna().unique()].min()
+            if earliest == start:
+                break
+            start = earliest
+
+    genes.update(names[:start].dropna())
+    return df.iloc[:start], df.iloc[start:]
+
+# the file of the chunk of variants that this worker process loaded last
+# (see load_chunk), or None
+_loaded_chunk = None
+
+# share the chunk of variants and its parsed genotypes written to a file
+# (path) by filter_chunk with this worker process, unless it already has
+def load_chunk(path):
+    global _loaded_chunk
+    if _loaded_chunk == path:
+        return
+    with open(path, "rb") as f:
+        df, parsed = pickle.load(f)
+    share_variants(df, parsed)
+    index_genes(df["Gene.refGene"])
+    _loaded_chunk = path
+
+# run every inheritance model for every subfamily of the Family object (fam)
+# on the shared chunk of variants (see share_variants), or on the one written
+# to a file (path) if it is given.
+# returns a list with the results of model_results for each subfamily
+def filter_chunk_job(fam, phen, path = None):
+    if path is not None:
+        load_chunk(path)
+    subfamresults, plan = subfamily_results(shared_variants(), generate_subfamilies(fam),
+                                            include_singleton = phen)
+    return subfamresults
+
+# combine the results of the inheritance model at position (i) in MODELS for
+# the subfamily (subfam) in every chunk (chunkresults) into the result of
+# running it on the whole data file.
+# include_singleton is passed to the ad and addn models
+def merge_chunk_results(i, chunkresults, subfam, include_singleton):
+    # models that return nothing, or an empty dataframe without columns, do
+    # so whatever the variants are
+    if all(result is None for result in chunkresults):
+        return None
+    chunkresults = [result for result in chunkresults
+                    if result is not None and len(result.columns) > 0]
+    if len(chunkresults) == 0:
+        return pd.DataFrame()
+
+    # keep one empty result for its columns if no chunk had any variants
+    merged = pd.concat([result for result in chunkresults if len(result) > 0]
+                       or chunkresults[:1])
+    if i == CH_MODEL:
+        return merged
+
+    # run the model again on the kept variants, in the order of the file
+    merged = merged.drop(columns = ADDED_COLUMNS).sort_index(kind = "mergesort")
+    return run_model(i, merged, subfam, include_singleton)
+
+# filter a data file read in chunks (chunks, e.g. from read_chunks) for every
+# Family object in (families), without and, if phen is True, with the
+# phenotype filter, the same way as filter_families does for the whole file.
+# the genotypes of the samples (samples) of every chunk are parsed before it
+# is filtered, spreading the families over (jobs) worker processes.
+# if (family) is a Family object, the variants of that family are also kept
+# (see family_variants).
+# returns a tuple of a list of results without and a list of results with
+# the phenotype filter, in the same order as families, and the variants of
+# (family), or None.
+# if (write) is given, it is called with each Family object and its results
+# as filter_families does, and the results are not kept.
+# the results of every chunk are kept until the whole file is read, and then
+# their columns read as text get the dtypes in the dict (found) that the
+# chunks added to it (see read_chunks), so that they have the same values as
+# when the whole file is read at once
+def filter_chunks(chunks, families, phen, samples, jobs = 1, family = None, write = None,
+                  found = None):
+    families = list(families)
+    job = functools.partial(filter_chunk_job, phen = phen)
+
+    # the results of every chunk for each family
+    chunkresults = [[] for fam in families]
+    fam_variants = []
+
+    # one pool of workers for every chunk, and a directory for the files of
+    # the chunks they load
+    pool = None
+    directory = None
+    if jobs > 1:
+        directory = tempfile.mkdtemp(prefix="via-chunks-")
+        pool = start_pool(jobs)
+    try:
+        genes = set()
+        held = None
+        for chunk in chunks:
+            chunk = verify(chunk)
+            if held is not None:
+                chunk = pd.concat([held, chunk])
+            chunk, held = split_genes(chunk, genes)
+            filter_chunk(chunk, families, samples, job, pool, directory, chunkresults,
+                         fam_variants, family)
+        if held is not None:
+            chunk, held = split_genes(held, genes, last = True)
+            filter_chunk(chunk, families, samples, job, pool, directory, chunkresults,
+                         fam_variants, family)
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    # free the genotypes of the last chunk
+    restore_genotypes((None, None, None))
+
+    def numbers(df):
+        return df if df is None or found is None else convert_numbers(df, found)
+
+    famresults = []
+    famresults_p = []
+    for fam, results in zip(families, chunkresults):
+        print("Filtering", fam.ID + '...')
+        with profile_stage("family", fam.ID) as record:
+            subfamilies = generate_subfamilies(fam)
+            plan = plan_models(subfamilies, include_singleton = phen)
+            def merge(i, s):
+                chunkresults = [numbers(result[s][i]) for result in results]
+                with profile_stage("merge", fam.ID, MODELS[i].__name__,
+                                   sum(row_count(result) for result in chunkresults),
+                                   subfamily = subfamilies[s].child.ID) as modelrecord:
+                    merged = merge_chunk_results(i, chunkresults, subfamilies[s],
+                                                 include_singleton = phen)
+                    modelrecord["rows_out"] = row_count(merged)
+                return merged
+            subfamresults = planned_results(plan, subfamilies, merge)
+            report_plan(plan)
+
+            if phen:
+                famresult, famresult_p = combine_results_both(subfamresults, subfamilies, fam)
+                record["rows_out_phen"] = len(famresult_p)
+            else:
+                famresult, famresult_p = combine_results(sum(subfamresults, []), fam, phenfilter = False), None
+            record["rows_out"] = len(famresult)
+
+        if write is not None:
+            write(fam, famresult, famresult_p)
+        else:
+            famresults.append(famresult)
+            if phen:
+                famresults_p.append(famresult_p)
+
+    if family is not None:
+        # filter again to remove the same duplicated rows as for the whole file
+        fam_variants = family_variants(numbers(pd.concat(fam_variants)), family)
+    else:
+        fam_variants = None
+
+    return famresults, famresults_p, fam_variants
+
+# filter one chunk of variants (df), whose genes are complete, for every
+# Family object in (families) with the function (job), spreading the families
+# over the workers of a pool (pool) if it is given, and add the results to
+# the list of results of each family (chunkresults).
+# the genotypes of the samples (samples) are parsed first, and with a pool,
+# the chunk is written to a file in the directory (directory) for its
+# workers. if (family) is a Family object, its variants are added to the
+# list (fam_variants)
+def filter_chunk(df, families, samples, job, pool, directory, chunkresults, fam_variants, family):
+    if len(df) == 0:
+        return
+    print("Filtering variants", df.index[0], "to", str(df.index[-1]) + "...")
+    with profile_stage("chunk", rows_in = len(df), first_row = int(df.index[0])):
+        parse_genotypes(df, samples)
+        index_genes(df["Gene.refGene"])
+
+        if family is not None:
+            fam_variants.append(family_variants(df, family))
+
+        path = None
+        if pool is not None:
+            path = os.path.join(directory, "chunk" + str(df.index[0]) + ".pkl")
+            with open(path, "wb") as f:
+                pickle.dump((df, parsed_genotypes()), f, protocol=4)
+            job = functools.partial(job, path = path)
+
+        for results, result in zip(chunkresults, map_families(job, df, families, pool = pool)):
+            results.append(result)
+        if path is not None:
+            os.remove(path)
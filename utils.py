@@ -1,6 +1,15 @@
+import functools
+import gc
+import multiprocessing
+import sys
+import numpy as np
 import pandas as pd
 from family import *
 from models import *
+from cache import *
+from loading import *
+from profiling import *
+from regions import *
 
 # get a dict of family IDs as keys and Family objects as values
 # from the PED file (pedfile)
@@ -54,7 +63,16 @@ import os
 # the phenotype is taken from the phenotype file (phenfile) and the mapping
 # from HPO number to genes is taken from (mapfile) or, if it does not exist,
 # is downloaded.
-def load_phen(families, phenfile, mapfile):
+# if cache is True, the mapping is read from (and kept in) a cache next to
+# the mapfile (see cache.py)
+def load_phen(families, phenfile, mapfile, cache = False):
+    add_phenotypes(families, phenfile, load_hpo_genes(mapfile, cache))
+
+# get a dict of HPO numbers and the genes associated with them from the
+# mapfile (mapfile) or, if it does not exist, download it.
+# if cache is True, the mapping is read from (and kept in) a cache next to
+# the mapfile (see cache.py)
+def load_hpo_genes(mapfile, cache = False):
 
     # if the mapfile does not exist in the current directory
     if not os.path.isfile(mapfile):
@@ -73,13 +91,18 @@ def load_phen(families, phenfile, mapfile):
             print("exiting now")
             exit()
 
-    # read the mapfile into a dataframe
-    phen_to_genes = pd.read_csv(mapfile, sep = '\t', header = None, comment = '#')
+    # get a dict of HPO numbers and the genes associated with them
+    hpo_genes = load_index(mapfile) if cache else None
+    if hpo_genes is None:
+        hpo_genes = read_mapfile(mapfile)
+        if cache:
+            save_index(mapfile, hpo_genes)
+    return hpo_genes
 
-    # rename the columns of the dataframe
-    phen_to_genes.columns = ["HPO-id", "HPO label", "gene-id",
-            "gene-symbol", "additional-info",
-            "source", "disease-ID"]
+# give each family in the list of families (families) the HPO numbers listed
+# for it in the phenotype file (phenfile), and the genes associated with them
+# in the dict of HPO numbers to genes (hpo_genes)
+def add_phenotypes(families, phenfile, hpo_genes):
 
     # read the phenfile into a dataframe
     phenDf = pd.read_csv(phenfile, sep='\t')
@@ -93,19 +116,166 @@ def load_phen(families, phenfile, mapfile):
             # get the HPO numbers from this row of the phenotype dataframe
             hpo = phenDf["HPO"][i]
             # get a list of HPO numbers by splitting them by the comma
-            fam.HPO = hpo.split(',')
-            # for each HPO number,
-            for HPO in fam.HPO:
-                # use the phenotype-to-gene dataframe to get a list of genes
-                # associated with that HPO number
-                genes = phen_to_genes[phen_to_genes["HPO-id"]==HPO]['gene-symbol'].tolist()
-                # get a list of the number of phenotypes associated with each gene
-                # (it will be just 1 if we have not encountered this gene
-                #  in this family yet, and the existing number + 1 otherwise)
-                gene_nums = [fam.genes[gene]+1 if gene in fam.genes else 1 for gene in genes]
-                # update the family's dict of associated genes and their
-                # numbers of phenotypes
-                fam.genes.update(dict(zip(genes, gene_nums)))
+            add_phen_genes(fam, hpo.split(','), hpo_genes)
+
+# give the Family object (fam) the HPO numbers (hpos), and add the genes
+# associated with them in the dict of HPO numbers to genes (hpo_genes) to its
+# dict of genes
+def add_phen_genes(fam, hpos, hpo_genes):
+    fam.HPO = hpos
+    # for each HPO number,
+    for HPO in fam.HPO:
+        # get a list of genes associated with that HPO number
+        genes = hpo_genes.get(HPO, [])
+        # get a list of the number of phenotypes associated with each gene
+        # (it will be just 1 if we have not encountered this gene
+        #  in this family yet, and the existing number + 1 otherwise)
+        gene_nums = [fam.genes[gene]+1 if gene in fam.genes else 1 for gene in genes]
+        # update the family's dict of associated genes and their
+        # numbers of phenotypes
+        fam.genes.update(dict(zip(genes, gene_nums)))
+
+# read the mapping from HPO number to genes from the mapfile (mapfile) into
+# a dict with the HPO numbers as keys and lists of the gene symbols mapped to
+# each of them as values, in the order of the mapfile
+def read_mapfile(mapfile):
+
+    # read the HPO-id and gene-symbol columns of the mapfile into a dataframe
+    phen_to_genes = pd.read_csv(mapfile, sep = '\t', header = None, comment = '#',
+                                usecols = [0, 3])
+    phen_to_genes.columns = ["HPO-id", "gene-symbol"]
+
+    # group the gene symbols by HPO number once, instead of scanning the
+    # whole table for every HPO number of every family
+    groups = phen_to_genes.groupby("HPO-id", sort = False)["gene-symbol"]
+    return {hpo: genes.tolist() for hpo, genes in groups}
+
+# load the variants of the data file (path) for the samples (samples), and
+# parse their genotypes (see parse_genotypes): from the cache of a previous
+# run on the same file if cache is True and there is one for the columns
+# (columns), otherwise reading the file (only the columns the filters need if
+# prune_columns is True), checking it with verify and, if cache is True,
+# saving it in the cache.
+# if (regions) is given (see read_regions), only the variants in the regions
+# are kept, and only their genotypes are parsed.
+# if compact is True, the variants are kept in compact storage (see
+# compact.py), and, unless cache is True, the file is read and compacted a
+# chunk at a time (see load_compact).
+# returns the dataframe of variants
+def load_variants(path, samples, columns, cache = False, prune_columns = False, regions = None,
+                  compact = False):
+    clear_store()
+    if compact and not cache:
+        with profile_stage("load_compact") as record:
+            df = load_compact(path, samples, columns, prune_columns, regions)
+            record["rows_out"] = len(df)
+        return df
+
+    # load the variants from the cache of a previous run on the same file
+    df = None
+    if cache:
+        with profile_stage("load_cache") as record:
+            df = load_cache(path, samples, columns)
+            record["rows_out"] = row_count(df)
+    if df is not None:
+        if regions is not None:
+            df = restrict_variants(df, regions)
+        return compact_variants(df, path) if compact else df
+
+    # read in the file containing variants
+    with profile_stage("read_variants") as record:
+        if prune_columns:
+            df = read_variants(path, samples)
+        else:
+            df = read_data(path)
+        record["rows_out"] = len(df)
+    #check that there are no errors, and remove rows with errors.
+    with profile_stage("verify", rows_in = len(df)) as record:
+        df = verify(df)
+        record["rows_out"] = len(df)
+    # the cache has every variant of the data file, so the regions are only
+    # selected after it is saved
+    if regions is not None and not cache:
+        df = select_regions(df, regions)
+
+    # decode the genotypes of everyone in the pedigree once, so that the
+    # filters compare genotype codes instead of scanning the sample strings
+    with profile_stage("parse_genotypes", rows_in = len(df), samples = len(samples)):
+        parse_genotypes(df, samples)
+    if cache:
+        with profile_stage("save_cache"):
+            save_cache(path, df)
+        if regions is not None:
+            df = restrict_variants(df, regions)
+    return compact_variants(df, path) if compact else df
+
+# the number of sample strings load_compact reads at a time
+COMPACT_CELLS = 500000
+
+# read the variant data file (path) into compact storage (see compact.py), as
+# load_variants does for the samples (samples), columns (columns), and
+# prune_columns and regions, reading it a chunk of rows at a time and
+# compacting each chunk once its genotypes are parsed, so that the strings
+# of only one chunk are in memory at once.
+# returns the dataframe of variants
+def load_compact(path, samples, columns, prune_columns = False, regions = None):
+    strings = sample_columns(path, columns)
+    chunksize = max(1000, COMPACT_CELLS // max(len(strings), 1))
+    # the dtypes of the whole file of the columns read as text (see read_chunks)
+    found = {}
+    if prune_columns:
+        chunks = read_variants(path, samples, chunksize, found)
+    else:
+        # (the sample columns of a VCF file are always read as text)
+        dtypes = None if is_vcf(path) else {col: str for col in strings}
+        chunks = read_chunks(path, columns, chunksize, dtypes, found)
+
+    open_store(strings)
+    frames, decoded = [], []
+    for chunk in chunks:
+        chunk = verify(chunk)
+        if regions is not None:
+            chunk = chunk.iloc[region_rows(chunk, regions)]
+        decoded.append(compact_decoded(decode_samples(chunk, samples)))
+        frames.append(compact_chunk(chunk))
+    close_store()
+
+    df = pd.concat(frames)
+    # the categoricals (see read_variants) of the chunks have different
+    # categories
+    for col in frames[0].columns[frames[0].dtypes == "category"]:
+        df[col] = df[col].astype("category")
+    # the other columns were read as text, and get the dtypes of the whole
+    # file now that every row is read
+    df = convert_numbers(df, found)
+    restore_genotypes(tuple(pd.concat(parts) for parts in zip(*decoded)))
+    return df
+
+# get the dataframe of variants of the data file (path) whose genotypes were
+# parsed (df) in compact storage (see compact.py)
+def compact_variants(df, path):
+    with profile_stage("compact", rows_in = len(df)):
+        open_store(sample_columns(path, df.columns))
+        df = compact_chunk(df)
+        close_store()
+        restore_genotypes(compact_decoded(parsed_genotypes()))
+    return df
+
+# get the variants of a dataframe of variants (df) in the regions (regions,
+# see read_regions)
+def select_regions(df, regions):
+    with profile_stage("regions", rows_in = len(df)) as record:
+        df = df.iloc[region_rows(df, regions)]
+        record["rows_out"] = len(df)
+    return df
+
+# get the variants of the dataframe of variants whose genotypes were parsed
+# (df) in the regions (regions, see read_regions), keeping only the parsed
+# genotypes of those variants
+def restrict_variants(df, regions):
+    df = select_regions(df, regions)
+    restore_genotypes(tuple(decoded.loc[df.index] for decoded in parsed_genotypes()))
+    return df
 
 # Checks that DP is in every row in the FORMAT column
 def verify(df):
@@ -170,85 +340,371 @@ def generate_subfamilies(fam):
 # combine multiple instances of the same variant in df into one row,
 # getting a new dataframe
 def combine_duplicates(df):
-    # use a generated location string to determine if two variants
-    # are the same or not. These location strings should be different
-    # if and only if the two variants are different
-    df["loc"] = [chrom + str(start) + str(end) for chrom, start, end in
-                        zip(df['Chr'], df['Start'], df["End"])]
-
-    # get a list of the unique location strings
-    uniquelocs = df["loc"].unique()
-
-    # create an empty dataframe to store the output
-    combined = pd.DataFrame()
-
-    # for every unique location string,
-    for loc in uniquelocs:
-        # get a dataframe of the rows in df with that location string
-        rows = df[df["loc"] == loc]
-        # since the rows are identical except for the sample and inh model
-        # in formation, get a dataframe containing just the first of the rows
-        output = rows.head(1).copy()
-
-        # create a string that is all of the samples in the rows separated
-        # by commas
-        samplestring = ""
-        for sample in rows["sample"]:
-            samplestring += sample + ","
-        samplestring = samplestring[:-1]  # remove last comma
-
-        # create a string that is all of the inheritance models in the rows
-        # separated by commas
-        modelstring = ""
-        for model in rows["inh model"]:
-            modelstring += model + ","
-        modelstring = modelstring[:-1]  # remove last comma
-
-        # put these strings into the output row and delete the column
-        # containing the location string
-        output["sample"] = [samplestring]
-        output["inh model"] = [modelstring]
-        del (output["loc"])
-
-        #add the output row to the dataframe
-        combined = pd.concat([combined, output])
+    # two rows are instances of the same variant if and only if they have the
+    # same location
+    location = ["Chr", "Start", "End"]
+
+    if len(df) == 0:
+        return df
+
+    # group the rows by location, keeping the groups in the order in which
+    # each location first appears
+    # (observed=True keeps a categorical Chr from adding every combination
+    # of categories and positions)
+    groups = df.groupby(location, sort=False, dropna=False, observed=True)
+
+    # since the rows of a location are identical except for the sample and
+    # inh model information, keep just the first of them, and replace its
+    # sample and inh model with all of the samples and inheritance models of
+    # the location, separated by commas
+    combined = df.drop_duplicates(subset=location).copy()
+    combined["sample"] = groups["sample"].agg(",".join).values
+    combined["inh model"] = groups["inh model"].agg(",".join).values
 
     return combined
 
-# filter a dataframe of variants (df), getting the ones for which
-# inheritance models for the Family object (fam) fit.
-# apply the phenotype filter if phenfilter is True
-def filter_family(df, fam, phenfilter):
-
-    # generate a list of subfamilies centered on each affected individual
-    subfamilies = generate_subfamilies(fam)
-
-    # empty dataframe for results in this family
-    famresult = pd.DataFrame()
+# the inheritance models, in the order of their results in model_results
+MODELS = [ad_model, ar_model, xl_model, xldn_model, de_novo_model, cmpd_het_model]
+
+# the names of the inheritance models in MODELS, as in the inh model column of
+# the results
+MODEL_NAMES = ["ad", "ar", "xl", "xldn", "addn", "ch"]
+
+# the positions of the ad and addn models in MODELS, whose results depend on
+# include_singleton
+SINGLETON_MODELS = [0, 4]
+
+# get the result of the inheritance model at position (i) in MODELS for the
+# subfamily (subfam) in a dataframe of variants (df).
+# include_singleton is passed to the ad and addn models
+def run_model(i, df, subfam, include_singleton):
+    if i in SINGLETON_MODELS:
+        return MODELS[i](df, subfam, include_singleton = include_singleton)
+    return MODELS[i](df, subfam)
+
+# get the results of every inheritance model for the subfamily (subfam) in a
+# dataframe of variants (df), as a list of dataframes in the order of MODELS.
+# include_singleton is passed to the ad and addn models
+def model_results(df, subfam, include_singleton):
+    return [run_model(i, df, subfam, include_singleton) for i in range(len(MODELS))]
+
+# get a key for the inheritance model at position (i) in MODELS and the
+# subfamily (subfam), made of everything the model reads from the subfamily
+# besides the ID of its child, which only goes into the sample column of the
+# result. subfamilies with the same key get the same variants from the model,
+# e.g. the ad and ar models of the subfamilies of affected siblings, who have
+# the same people and parents.
+# include_singleton is passed to the ad and addn models
+def model_key(i, subfam, include_singleton):
+    model = MODELS[i]
+    people = frozenset((person.ID, person.affected) for person in subfam.people)
+    parents = (subfam.father.ID, subfam.father.affected,
+               subfam.mother.ID, subfam.mother.affected)
+    noparents = not subfam.hasFather and not subfam.hasMother
+
+    if model is ad_model:
+        return (i, people, noparents, include_singleton)
+    if model is ar_model:
+        # the parents are also filtered for 0/1
+        return (i, people, frozenset(person.ID for person in subfam.people
+                                     if person == subfam.father or person == subfam.mother))
+    if model is xl_model or model is xldn_model:
+        # the order of the people decides the order of the variants
+        people = tuple((person.ID, person.affected, person.unaffected, person.male)
+                       for person in subfam.people)
+        return (i, people, parents, model is xldn_model and subfam.child.female)
+    if model is de_novo_model:
+        # the child is filtered like an affected sibling
+        children = frozenset([(subfam.child.ID, True)] +
+                             [(sib.ID, sib.affected) for sib in subfam.siblings])
+        return (i, children, parents, noparents, include_singleton)
+    return (i, subfam.child.ID, subfam.hasFather, subfam.hasMother, parents)
+
+# plan which inheritance models to run for the subfamilies (subfamilies),
+# running each of them only once for subfamilies with the same model_key.
+# returns a list with, for each subfamily, a list with the position of the
+# subfamily whose result to use for each model in MODELS
+def plan_models(subfamilies, include_singleton):
+    first = {}
+    return [[first.setdefault(model_key(i, subfam, include_singleton), s)
+             for i in range(len(MODELS))]
+            for s, subfam in enumerate(subfamilies)]
+
+# get the results of every inheritance model for each subfamily in
+# (subfamilies), as planned by plan_models (plan), getting the result of the
+# model at position i in MODELS for the subfamily at position s with
+# run(i, s). the results of other subfamilies are used with their sample
+# column changed.
+# returns a list with a list of results in the order of MODELS for each
+# subfamily
+def planned_results(plan, subfamilies, run):
+    subfamresults = []
+    for s, subfam in enumerate(subfamilies):
+        results = []
+        for i, planned in enumerate(plan[s]):
+            if planned == s:
+                results.append(run(i, s))
+            else:
+                results.append(shared_result(subfamresults[planned][i], subfam))
+        subfamresults.append(results)
+    return subfamresults
+
+# get the result of an inheritance model for another subfamily (result) for
+# the subfamily (subfam), which only differs in its sample column
+def shared_result(result, subfam):
+    if result is None or len(result.columns) == 0:
+        return result
+    return result.assign(sample = subfam.child.ID)
+
+# add to the report of the run (--profile-report) how many of the inheritance
+# models of a family, as planned by plan_models (plan), were run and how many
+# were not because their results were shared between subfamilies
+def report_plan(plan):
+    shared = sum(planned != s for s, models in enumerate(plan) for planned in models)
+    add_fields(models_run = sum(len(planned) for planned in plan) - shared,
+               models_shared = shared)
+
+# get the results of every inheritance model for each subfamily in
+# (subfamilies) in a dataframe of variants (df), as a list with the results
+# of model_results for each of them, running each model only once for
+# subfamilies with the same model_key.
+# if (models) is a list of positions in MODELS, the other models are not run
+# and get empty results.
+# returns a tuple of the list and the plan of plan_models
+def subfamily_results(df, subfamilies, include_singleton, models = None):
+    plan = plan_models(subfamilies, include_singleton)
+    def run(i, s):
+        if models is not None and i not in models:
+            return pd.DataFrame()
+        with profile_stage("model", subfamilies[s].ID, MODELS[i].__name__, len(df),
+                           subfamily = subfamilies[s].child.ID) as record:
+            result = run_model(i, df, subfamilies[s], include_singleton)
+            record["rows_out"] = row_count(result)
+        return result
+    return planned_results(plan, subfamilies, run), plan
+
+# combine a list of model results (modelresults) for the Family object (fam)
+# into one dataframe with one row per variant, applying the phenotype filter
+# if phenfilter is True
+def combine_results(modelresults, fam, phenfilter):
+    famresult = pd.concat(modelresults)
 
-    if phenfilter and len(fam.genes) == 0:
-        print("Warning: no phenotypes listed for", fam.ID, "in the phenotype file.")
-        return famresult
-
-    # add model results for each subfamily
-    for subfam in subfamilies:
-        famresult = pd.concat([famresult, ad_model(df, subfam, include_singleton = phenfilter)])
-        famresult = pd.concat([famresult, ar_model(df, subfam)])
-        famresult = pd.concat([famresult, xl_model(df, subfam)])
-        famresult = pd.concat([famresult, xldn_model(df, subfam)])
-        famresult = pd.concat([famresult, de_novo_model(df, subfam, include_singleton = phenfilter)])
-        famresult = pd.concat([famresult, cmpd_het_model(df, subfam)])
     # combine multiple instances of the same variant into one row
-    famresult = combine_duplicates(famresult)
+    with profile_stage("combine_duplicates", fam.ID, rows_in = len(famresult)) as record:
+        famresult = combine_duplicates(famresult)
+        record["rows_out"] = len(famresult)
 
     # additionally apply the phenotype filter if requested
     if phenfilter:
-        famresult = filter_phen(famresult, fam)
+        with profile_stage("filter_phen", fam.ID, rows_in = len(famresult)) as record:
+            famresult = filter_phen(famresult, fam)
+            record["rows_out"] = len(famresult)
 
     # print helpful output
     phenfilterstring = 'with   ' if phenfilter else 'without'
     number = '{0:4d}'.format(len(famresult))
     print(number,'candidates',phenfilterstring,'phenotype filter')
 
-    # return the result
     return famresult
+
+# filter a dataframe of variants (df), getting the ones for which
+# inheritance models for the Family object (fam) fit.
+# apply the phenotype filter if phenfilter is True.
+# if (models) is a list of positions in MODELS, only those models are run
+def filter_family(df, fam, phenfilter, models = None):
+
+    # generate a list of subfamilies centered on each affected individual
+    subfamilies = generate_subfamilies(fam)
+
+    if phenfilter and len(fam.genes) == 0:
+        print("Warning: no phenotypes listed for", fam.ID, "in the phenotype file.")
+        return pd.DataFrame()
+
+    # collect the model results for each subfamily, and concatenate them
+    # once at the end
+    subfamresults, plan = subfamily_results(df, subfamilies, include_singleton = phenfilter,
+                                            models = models)
+    report_plan(plan)
+
+    return combine_results(sum(subfamresults, []), fam, phenfilter)
+
+# filter a dataframe of variants (df) for the Family object (fam) both
+# without and with the phenotype filter, running the inheritance models only
+# once per subfamily.
+# returns a tuple of the results without and with the phenotype filter, the
+# same as those of filter_family with phenfilter False and True.
+# if (models) is a list of positions in MODELS, only those models are run
+def filter_family_both(df, fam, models = None):
+
+    # generate a list of subfamilies centered on each affected individual
+    subfamilies = generate_subfamilies(fam)
+
+    subfamresults, plan = subfamily_results(df, subfamilies, include_singleton = True,
+                                            models = models)
+    report_plan(plan)
+
+    return combine_results_both(subfamresults, subfamilies, fam)
+
+# combine the model results of every subfamily (subfamilies) of the Family
+# object (fam), as a list with the results of model_results with
+# include_singleton True for each subfamily (subfamresults), into one
+# dataframe without and one with the phenotype filter.
+# returns a tuple of the two dataframes
+def combine_results_both(subfamresults, subfamilies, fam):
+    modelresults = []
+    modelresults_p = []
+    for subfam, results in zip(subfamilies, subfamresults):
+        # the two filters only differ in the ad and addn results of
+        # subfamilies without parents (singletons), which are only included
+        # with the phenotype filter
+        modelresults_p += results
+
+        noparents = not subfam.hasFather and not subfam.hasMother
+        if noparents:
+            results = [pd.DataFrame() if i in SINGLETON_MODELS else result
+                       for i, result in enumerate(results)]
+        modelresults += results
+
+    famresult = combine_results(modelresults, fam, phenfilter = False)
+
+    if len(fam.genes) == 0:
+        print("Warning: no phenotypes listed for", fam.ID, "in the phenotype file.")
+        return famresult, pd.DataFrame()
+
+    return famresult, combine_results(modelresults_p, fam, phenfilter = True)
+
+# get the variants in a dataframe of variants (df) that are not 0/0 in any
+# affected individual of the Family object (fam) and are 0/0 in every
+# unaffected one
+def family_variants(df, fam):
+    keep = np.ones(len(df), dtype=bool)
+    for person in fam.people:
+        exclude = person.phen != "Unaffected"
+        keep = keep & zyg_mask(df, person.ID, "0/0", exclude = exclude)
+    return select_rows(df, keep, [person.ID for person in fam.people], af = False)
+
+# the variant dataframe that filter_families shares with its worker processes.
+# workers started with fork inherit it (and the parsed genotypes) from the
+# parent process instead of each receiving a pickled copy
+_shared_df = None
+
+# set the variant dataframe (df) and, if given, the parsed genotypes (parsed)
+# shared with this process
+def share_variants(df, parsed = None):
+    global _shared_df
+    _shared_df = df
+    if parsed is not None:
+        restore_genotypes(parsed)
+
+# get the variant dataframe shared with this process
+def shared_variants():
+    return _shared_df
+
+# filter the shared variant dataframe for the Family object (fam), without
+# and, if phen is True, with the phenotype filter.
+# returns a tuple of the two resulting dataframes (the second is None if phen
+# is False)
+def filter_family_job(fam, phen):
+    print("Filtering", fam.ID + '...')
+    with profile_stage("family", fam.ID, rows_in = len(_shared_df)) as record:
+        if phen:
+            # run the models once for both results
+            famresult, famresult_p = filter_family_both(_shared_df, fam)
+            record["rows_out_phen"] = len(famresult_p)
+        else:
+            famresult, famresult_p = filter_family(_shared_df, fam, phenfilter = False), None
+        record["rows_out"] = len(famresult)
+    return famresult, famresult_p
+
+# filter a dataframe of variants (df) for every Family object in (families),
+# without and, if phen is True, with the phenotype filter, spreading the
+# families over (jobs) worker processes.
+# returns a list of results without and a list of results with the phenotype
+# filter, in the same order as families whatever the number of jobs.
+# if (write) is given, it is called with each Family object and its results
+# without and with the phenotype filter (None if phen is False) as soon as
+# they are ready, in the same order, and the results are not kept
+def filter_families(df, families, phen, jobs = 1, write = None):
+    job = functools.partial(filter_family_job, phen = phen)
+    if write is not None:
+        for fam, (famresult, famresult_p) in zip(families, iter_families(job, df, families, jobs)):
+            write(fam, famresult, famresult_p)
+        return [], []
+
+    famresults = map_families(job, df, families, jobs)
+
+    return ([famresult for famresult, famresult_p in famresults],
+            [famresult_p for famresult, famresult_p in famresults if phen])
+
+# call a function (job) for every Family object in (families), sharing the
+# dataframe of variants (df) with it (see share_variants) and spreading the
+# families over (jobs) worker processes, or over the workers of a pool
+# (pool, see start_pool) if it is given.
+# returns a list of the results, in the same order as families
+def map_families(job, df, families, jobs = 1, pool = None):
+    return list(iter_families(job, df, families, jobs, pool))
+
+# call a function (job) for every Family object in (families) as map_families
+# does, getting an iterator of the results in the same order as families,
+# each as soon as it and those before it are ready
+def iter_families(job, df, families, jobs = 1, pool = None):
+    if not reporting():
+        yield from run_jobs(job, df, families, jobs, pool)
+        return
+
+    # get the records of the report (see profiling.py) from the workers with
+    # the results
+    for result, records in run_jobs(functools.partial(call_reported, job), df, families,
+                                    jobs, pool):
+        add_records(records)
+        yield result
+
+# start a pool of (jobs) worker processes that is kept for several calls of
+# map_families (see filter_chunks). the variants are not shared with its
+# workers, so its jobs must get them themselves
+def start_pool(jobs):
+    # flush anything printed so far, so that workers do not print it again
+    sys.stdout.flush()
+    return multiprocessing.get_context().Pool(jobs)
+
+# call a function (job) for every Family object in (families) as
+# iter_families does, without getting the records of the report from the
+# workers
+def run_jobs(job, df, families, jobs, pool = None):
+    share_variants(df)
+
+    if pool is not None:
+        # imap keeps the results in the order of families
+        yield from pool.imap(job, families, chunksize = 1)
+        return
+
+    if jobs <= 1:
+        for fam in families:
+            yield job(fam)
+        return
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        # forked workers share the parent's memory, so keep the garbage
+        # collector from touching (and so copying) the loaded variants
+        context = multiprocessing.get_context("fork")
+        initargs = None
+        gc.freeze()
+    else:
+        # other start methods get one copy of the variants per worker
+        context = multiprocessing.get_context()
+        initargs = (df, parsed_genotypes())
+
+    # flush anything printed so far, so that workers do not print it again
+    sys.stdout.flush()
+    pool = context.Pool(jobs, initializer = share_variants if initargs else None,
+                        initargs = initargs or ())
+    try:
+        # imap keeps the results in the order of families
+        for result in pool.imap(job, families, chunksize = 1):
+            yield result
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+        if initargs is None:
+            gc.unfreeze()
@@ -0,0 +1,199 @@
+# This file is for reading the variants from a multi-sample VCF file annotated
+# by ANNOVAR (table_annovar.pl with -vcfinput), plain or compressed with bgzip
+# or gzip (e.g. cohort.vcf.gz), instead of the cleaned ANNOVAR table.
+#
+# The records are read into the same columns as the cleaned data file:
+# - Chr, Start, End, Ref and Alt from CHROM, POS, REF and ALT (End is the
+#   last base of REF)
+# - one column per INFO field declared in the header (e.g. Gene.refGene,
+#   CLNSIG and the allele frequencies), in the order of the header, with "."
+#   where a record does not have it. a field that appears twice in a record
+#   gets ".1" added the second time, as pandas does for the cleaned data file
+# - FORMAT and the sample columns, with the phased genotypes of biallelic
+#   variants (0|0, 0|1, 1|0, 1|1) written as unphased ones (0/0, 0/1, 0/1,
+#   1/1), as the cleaned data file has them
+# so the genotypes are then decoded (see genotypes.py) and filtered the same
+# way as those of the cleaned data file. Every step works on whole columns
+# of records at once.
+
+import csv
+import gzip
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+# the endings of the names of VCF files
+VCF_SUFFIXES = (".vcf", ".vcf.gz", ".vcf.bgz")
+
+# the columns of the variant data frame made from the fixed columns of a VCF
+# file, before its INFO fields
+POSITION_COLUMNS = ["Chr", "Start", "End", "Ref", "Alt"]
+
+# the fixed columns of a VCF file, before FORMAT and the samples
+FIXED_COLUMNS = ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]
+
+# the phased genotypes of biallelic variants, and the unphased genotypes of
+# the cleaned data file they are written as
+PHASED_GENOTYPES = {"0|0": "0/0", "0|1": "0/1", "1|0": "0/1", "1|1": "1/1"}
+
+# the characters ANNOVAR escapes in INFO values, and their escapes
+INFO_ESCAPES = {";": "\\x3b", "=": "\\x3d", " ": "\\x20", ",": "\\x2c"}
+
+# whether the data file (path) is a VCF file, from its name
+def is_vcf(path):
+    return path.lower().endswith(VCF_SUFFIXES)
+
+# open the VCF file (path) for reading text, decompressing it if its name
+# ends with .gz or .bgz
+def open_vcf(path):
+    if path.lower().endswith((".gz", ".bgz")):
+        return gzip.open(path, "rt")
+    return open(path)
+
+# read the header of the VCF file (path).
+# returns a tuple of the IDs of the INFO fields, the names of the samples,
+# and the number of header lines (the ## lines and the #CHROM line)
+def read_vcf_header(path):
+    info = []
+    with open_vcf(path) as f:
+        for number, line in enumerate(f, 1):
+            if line.startswith("##INFO=<"):
+                match = re.search(r"[<,]ID=([^,>]+)", line)
+                if match is not None:
+                    info.append(match.group(1))
+            elif line.startswith("#CHROM"):
+                fields = line.rstrip("\r\n").split("\t")
+                return info, fields[len(FIXED_COLUMNS) + 1:], number
+            elif not line.startswith("##"):
+                break
+    raise ValueError("The VCF file " + path + " has no #CHROM header line.")
+
+# get the columns of the variant data frame read from the VCF file (path)
+def vcf_columns(path):
+    info, samples, lines = read_vcf_header(path)
+    return POSITION_COLUMNS + info + ["FORMAT"] + samples
+
+# get the values of the INFO fields of the VCF records (info), a column of
+# INFO strings, as a dataframe with a column per field, with "." where a
+# record does not have a field (or has it as a flag, without a value) and
+# NaN where its value is empty
+def info_columns(info):
+    table = aligned_info(info)
+    if table is None:
+        table = info_pairs(info)
+
+    # only the values of the records with an escape are decoded
+    escaped = info.str.contains("\\x", regex=False).values
+    if escaped.any():
+        for col in table.columns:
+            values = table[col].values[escaped]
+            for char, escape in INFO_ESCAPES.items():
+                values = pd.Series(values, dtype=object).str.replace(escape, char, regex=False).values
+            table.loc[escaped, col] = values
+
+    # an empty value is missing, as an empty cell of the cleaned data file is
+    return table.fillna(".").replace("", np.nan)
+
+# get the values of the INFO fields of the VCF records (info) as info_columns
+# does, if every record has the same fields in the same order, as ANNOVAR
+# writes them. the INFO strings are split into fields by the CSV reader of
+# pandas, and the name of the field is cut off every value of each column.
+# returns None if the records have different fields
+def aligned_info(info):
+    text = "\n".join(info.values)
+    try:
+        fields = pd.read_csv(io.StringIO(text), sep=";", header=None, dtype=str,
+                             na_filter=False, quoting=csv.QUOTE_NONE)
+    except pd.errors.ParserError:
+        return None
+    if len(fields) != len(info):
+        return None
+
+    columns = {}
+    for col in fields.columns:
+        key = fields[col].iloc[0].split("=", 1)[0]
+        if key in ["", "."] or not fields[col].str.startswith(key + "=").all():
+            return None
+        # the second appearance of a field is (field).1, and so on
+        name = key
+        while name in columns:
+            name = key + "." + str(int(name[len(key) + 1:] or 0) + 1)
+        columns[name] = fields[col].str.slice(len(key) + 1).values
+    return pd.DataFrame(columns, index=info.index)
+
+# get the values of the INFO fields of the VCF records (info) as info_columns
+# does, for records with any fields in any order
+def info_pairs(info):
+    pairs = info.str.split(";").explode()
+    split = pairs.str.split("=", n=1, expand=True)
+    keys = split[0]
+    values = split[1] if 1 in split.columns else pd.Series(np.nan, index=split.index)
+
+    # name the second appearance of a field in a record (field).1, and so on
+    occurrence = keys.groupby([keys.index, keys.values]).cumcount().values
+    names = keys.where(occurrence == 0, keys + "." + occurrence.astype(str))
+
+    table = pd.DataFrame({"name": names.values, "value": values.values}, index=keys.index)
+    table = table[table["name"].notna() & (table["name"] != ".")]
+    table = table.set_index("name", append=True)["value"].unstack()
+    return table.reindex(info.index)
+
+# write the phased genotypes of biallelic variants in a column of sample
+# strings (strings) as unphased ones (see PHASED_GENOTYPES)
+def unphase(strings):
+    # the first three characters of every string, as fixed width strings
+    prefixes = strings.values.astype("U3")
+    phased = np.isin(prefixes, list(PHASED_GENOTYPES))
+    if not phased.any():
+        return strings
+    values = strings.values.copy()
+    values[phased] = [PHASED_GENOTYPES[string[:3]] + string[3:] for string in values[phased]]
+    return pd.Series(values, index=strings.index, name=strings.name)
+
+# make a variant data frame with the columns (columns, see vcf_columns) from
+# a dataframe of VCF records (records)
+def vcf_frame(records, columns):
+    df = pd.DataFrame(index=records.index)
+    df["Chr"] = records["#CHROM"]
+    df["Start"] = records["POS"].astype(np.int64)
+    df["End"] = df["Start"] + records["REF"].str.len() - 1
+    df["Ref"] = records["REF"]
+    df["Alt"] = records["ALT"]
+
+    info = info_columns(records["INFO"])
+    samples = [col for col in records.columns[len(FIXED_COLUMNS) + 1:] if col in columns]
+    parts = [df, info, records[["FORMAT"]]] + [unphase(records[name]).rename(name) for name in samples]
+    df = pd.concat(parts, axis=1)
+
+    # the columns, then the repeated INFO fields of the fields among them
+    # (e.g. AF.1 after AF) in the order of their names
+    extra = sorted(col for col in info.columns
+                   if col not in columns and re.sub(r"\.\d+$", "", col) in columns)
+    # INFO fields that no record has are "." throughout
+    missing = [col for col in columns if col not in df.columns]
+    df = df.reindex(columns=columns + extra)
+    df[missing] = "."
+    return df
+
+# read the variants of the VCF file (path) into a variant data frame with
+# the columns (columns, see vcf_columns) if given, or all of them.
+# the index is the position of each record in the file.
+# if chunksize is given, the file is read (chunksize) records at a time,
+# getting an iterator of dataframes
+def read_vcf(path, columns = None, chunksize = None):
+    info, samples, lines = read_vcf_header(path)
+    if columns is None:
+        columns = POSITION_COLUMNS + info + ["FORMAT"] + samples
+    names = FIXED_COLUMNS + ["FORMAT"] + samples
+
+    # only the samples of the columns are read
+    usecols = FIXED_COLUMNS + ["FORMAT"] + [name for name in samples if name in columns]
+    records = pd.read_csv(path, sep='\t', header=None, names=names, usecols=usecols,
+                          skiprows=lines, dtype=str, na_filter=False,
+                          compression="gzip" if path.lower().endswith((".gz", ".bgz")) else None,
+                          chunksize=chunksize)
+    if chunksize is not None:
+        return (vcf_frame(chunk, columns) for chunk in records)
+    return vcf_frame(records, columns)